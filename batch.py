@@ -0,0 +1,103 @@
+import os
+import threading
+from collections import deque, OrderedDict
+from itertools import islice, repeat
+from concurrent.futures import ProcessPoolExecutor
+from modules import PermutationCache
+from cryptosystem import HybridCryptosystem
+
+BATCH_CHUNK_SIZE = 256
+WORKER_CACHE_BYTES = 32 * 1024 * 1024
+WORKER_SYSTEM_LIMIT = 4
+
+# The most recently used HybridCryptosystems per key set. The keys are secrets, so only a
+# few key sets stay in memory; thread pools share this cache, hence the lock
+worker_systems = OrderedDict()
+worker_systems_lock = threading.Lock()
+
+def get_worker_system(keys):
+    # keys is (lane keys, MAC key) as built by system_keys; lane keys hold one
+    # (cipher factory, key) pair per lane
+    with worker_systems_lock:
+        hybrid = worker_systems.get(keys)
+        if hybrid is not None:
+            worker_systems.move_to_end(keys)
+            return hybrid
+    lane_keys, mac_key = keys
+    hybrid = HybridCryptosystem(perm_cache=PermutationCache(WORKER_CACHE_BYTES), lanes=len(lane_keys),
+                                mac_key=mac_key)
+    hybrid.aes_lanes = [cipher(key) for cipher, key in lane_keys]
+    with worker_systems_lock:
+        worker_systems[keys] = hybrid
+        while len(worker_systems) > WORKER_SYSTEM_LIMIT:
+            worker_systems.popitem(last=False)
+    return hybrid
+
+def encrypt_chunk(keys, items):
+    hybrid = get_worker_system(keys)
+    results = []
+    for message, chaos_override in items:
+        # Containers record every lane length and skip the index lists, which are costly to pickle
+        results.append(hybrid.encrypt_container(message, chaos_override))
+    return results
+
+def decrypt_chunk(keys, items):
+    hybrid = get_worker_system(keys)
+    return [hybrid.decrypt(*item) for item in items]
+
+def encrypt_bytes_chunk(keys, items):
+    hybrid = get_worker_system(keys)
+    return [hybrid.encrypt_bytes(data, chaos_override) for data, chaos_override in items]
+
+def decrypt_bytes_chunk(keys, items):
+    hybrid = get_worker_system(keys)
+    return [hybrid.decrypt_bytes(container, *chaos_params) for container, chaos_params in items]
+
+def open_envelope_chunk(keys, items):
+    hybrid = get_worker_system(keys)
+    return [hybrid.open_envelope(container, *chaos_params) for container, chaos_params in items]
+
+def system_keys(hybrid):
+    # The MAC key travels with the lane keys, so worker systems seal and verify like the parent
+    return tuple((type(aes), aes.key) for aes in hybrid.aes_lanes), hybrid.mac_key
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def run_batches(hybrid, func, items, executor, max_workers, chunk_size, max_pending):
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers)
+    window = max_pending or 2 * (max_workers or os.cpu_count() or 1)
+    keys = system_keys(hybrid)
+    pending = deque()
+    try:
+        # Bounded submission keeps memory flat and results in input order
+        for batch in batched(items, chunk_size):
+            pending.append(executor.submit(func, keys, batch))
+            if len(pending) >= window:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown()
+
+def encrypt_many(hybrid, messages, chaos_overrides=None, executor=None, max_workers=None,
+                 chunk_size=BATCH_CHUNK_SIZE, max_pending=None):
+    if chaos_overrides is None:
+        chaos_overrides = repeat(None)
+    items = zip(messages, chaos_overrides)
+    return run_batches(hybrid, encrypt_chunk, items, executor, max_workers, chunk_size, max_pending)
+
+def decrypt_many(hybrid, items, executor=None, max_workers=None,
+                 chunk_size=BATCH_CHUNK_SIZE, max_pending=None):
+    # items are (merged, r_1, x0_1, ..., r_N, x0_N) as yielded by encrypt_many
+    return run_batches(hybrid, decrypt_chunk, items, executor, max_workers, chunk_size, max_pending)
@@ -0,0 +1,195 @@
+import os
+import sys
+import json
+import math
+import time
+import platform
+import argparse
+from modules import AES_CBC, PermutationCache
+from cryptosystem import HybridCryptosystem, generate_chaos_params
+from profiling import StageProfiler, observe, print_stage_report
+
+DEFAULT_SIZES = [1024, 16 * 1024, 256 * 1024]
+DEFAULT_LANES = [2, 4]
+# Cold by default: with a permutation cache, orbit generation and sorting drop out after warmup
+DEFAULT_CACHE = [False]
+DEFAULT_WARMUP = 2
+DEFAULT_REPEATS = 10
+DEFAULT_THRESHOLD = 0.10
+
+def measure(func, warmup=DEFAULT_WARMUP, repeats=DEFAULT_REPEATS):
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        func()
+        samples.append(time.perf_counter_ns() - start)
+    return samples
+
+def percentile(sorted_samples, fraction):
+    # Linear interpolation between the closest ranks
+    if len(sorted_samples) == 1:
+        return float(sorted_samples[0])
+    pos = (len(sorted_samples) - 1) * fraction
+    low = math.floor(pos)
+    high = min(low + 1, len(sorted_samples) - 1)
+    return sorted_samples[low] + (sorted_samples[high] - sorted_samples[low]) * (pos - low)
+
+def summarize(samples, size=None):
+    ordered = sorted(samples)
+    mean = sum(ordered) / len(ordered)
+    variance = sum((s - mean) ** 2 for s in ordered) / (len(ordered) - 1) if len(ordered) > 1 else 0.0
+    stats = {
+        'repeats': len(ordered),
+        'min_ns': ordered[0],
+        'max_ns': ordered[-1],
+        'mean_ns': mean,
+        'median_ns': percentile(ordered, 0.5),
+        'p95_ns': percentile(ordered, 0.95),
+        'stddev_ns': math.sqrt(variance),
+    }
+    if size:
+        stats['throughput_mb_s'] = size / (stats['median_ns'] / 1e9) / 1e6 if stats['median_ns'] else 0.0
+    return stats
+
+def benchmark_cases(size, lanes, cache=False):
+    data = os.urandom(size)
+    text = data.hex()[:size]
+    aes = AES_CBC()
+    aes_ct = aes.encrypt(data)
+    hybrid = HybridCryptosystem(perm_cache=PermutationCache() if cache else None, lanes=lanes)
+    chaos = generate_chaos_params(lanes)
+    merged = hybrid.encrypt(text, chaos)[0]
+    container = hybrid.encrypt_bytes(data, chaos)[0]
+    ct_buf, pt_buf = bytearray(), bytearray()
+    return {
+        'aes_encrypt': lambda: aes.encrypt(data),
+        'aes_decrypt': lambda: aes.decrypt(aes_ct),
+        'hybrid_encrypt': lambda: hybrid.encrypt(text, chaos),
+        'hybrid_decrypt': lambda: hybrid.decrypt(merged, *chaos),
+        'hybrid_encrypt_bytes': lambda: hybrid.encrypt_bytes(data, chaos, out=ct_buf),
+        'hybrid_decrypt_bytes': lambda: hybrid.decrypt_bytes(container, *chaos, out=pt_buf),
+    }
+
+def profile_stages(func, repeats=DEFAULT_REPEATS):
+    # Separate pass so the timed samples never include observer overhead
+    profiler = StageProfiler()
+    with observe(profiler):
+        for _ in range(repeats):
+            func()
+    return profiler.report()
+
+def run_suite(sizes=DEFAULT_SIZES, lanes_list=DEFAULT_LANES, warmup=DEFAULT_WARMUP, repeats=DEFAULT_REPEATS, cases=None,
+              stages=False, cache_list=DEFAULT_CACHE):
+    results = []
+    for size in sizes:
+        for lanes in lanes_list:
+            for cache in cache_list:
+                for name, func in benchmark_cases(size, lanes, cache).items():
+                    if cases and name not in cases:
+                        continue
+                    # AES depends on neither the lane count nor the cache, measure it once per size
+                    if name.startswith('aes_') and (lanes != lanes_list[0] or cache != cache_list[0]):
+                        continue
+                    stats = summarize(measure(func, warmup, repeats), size)
+                    if stages and name.startswith('hybrid_'):
+                        stats['stages'] = profile_stages(func, repeats)
+                    results.append({'case': name, 'size': size, 'lanes': lanes, 'cache': cache, **stats})
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'warmup': warmup,
+            'repeats': repeats,
+        },
+        'results': results,
+    }
+
+def result_key(result):
+    # Runs saved before the cache dimension existed were all cached
+    return result['case'], result['size'], result['lanes'], result.get('cache', True)
+
+def compare_runs(baseline, current, threshold=DEFAULT_THRESHOLD):
+    base = {result_key(r): r for r in baseline['results']}
+    rows = []
+    for result in current['results']:
+        old = base.get(result_key(result))
+        if old is None or not old['median_ns']:
+            continue
+        change = result['median_ns'] / old['median_ns'] - 1
+        rows.append({
+            'case': result['case'],
+            'size': result['size'],
+            'lanes': result['lanes'],
+            'cache': result.get('cache', True),
+            'baseline_median_ns': old['median_ns'],
+            'current_median_ns': result['median_ns'],
+            'change': change,
+            'regression': change > threshold,
+        })
+    return rows
+
+def print_results(report):
+    print("| Case                 | Size     | Lanes | Cache | Median (ms) | p95 (ms) | Stddev (ms) | MB/s     |")
+    print("|----------------------|----------|-------|-------|-------------|----------|-------------|----------|")
+    for r in report['results']:
+        cache = 'on' if r.get('cache', True) else 'off'
+        print(f"| {r['case']:<20} | {r['size']:>8} | {r['lanes']:>5} | {cache:>5} | {r['median_ns'] / 1e6:>11.3f} "
+              f"| {r['p95_ns'] / 1e6:>8.3f} | {r['stddev_ns'] / 1e6:>11.3f} | {r['throughput_mb_s']:>8.2f} |")
+    for r in report['results']:
+        if 'stages' in r:
+            cache = 'on' if r.get('cache', True) else 'off'
+            print_stage_report(r['stages'], f"{r['case']} size={r['size']} lanes={r['lanes']} cache={cache}")
+
+def print_comparison(rows, threshold):
+    print("| Case                 | Size     | Lanes | Cache | Baseline (ms) | Current (ms) | Change  |")
+    print("|----------------------|----------|-------|-------|---------------|--------------|---------|")
+    for row in rows:
+        flag = "  REGRESSION" if row['regression'] else ""
+        cache = 'on' if row['cache'] else 'off'
+        print(f"| {row['case']:<20} | {row['size']:>8} | {row['lanes']:>5} | {cache:>5} "
+              f"| {row['baseline_median_ns'] / 1e6:>13.3f} "
+              f"| {row['current_median_ns'] / 1e6:>12.3f} | {row['change'] * 100:>+6.1f}% |{flag}")
+    regressions = sum(row['regression'] for row in rows)
+    print(f"\n{regressions} regression(s) beyond {threshold * 100:.0f}%")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hybrid AES + DNA + chaos benchmark suite")
+    sub = parser.add_subparsers(dest='command', required=True)
+    run = sub.add_parser('run', help="run the benchmark matrix")
+    run.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    run.add_argument('--lanes', type=int, nargs='+', default=DEFAULT_LANES)
+    run.add_argument('--warmup', type=int, default=DEFAULT_WARMUP)
+    run.add_argument('--repeats', type=int, default=DEFAULT_REPEATS)
+    run.add_argument('--cases', nargs='+', default=None)
+    run.add_argument('--stages', action='store_true', help="add a per-stage breakdown for the hybrid cases")
+    run.add_argument('--cache', nargs='+', choices=('off', 'on'), default=['off'],
+                     help="permutation cache settings to measure (on hides orbit and sort after warmup)")
+    run.add_argument('--output', help="write results as JSON to this path")
+    compare = sub.add_parser('compare', help="compare two JSON runs")
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        report = run_suite(args.sizes, args.lanes, args.warmup, args.repeats, args.cases, args.stages,
+                           [setting == 'on' for setting in args.cache])
+        print_results(report)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare_runs(baseline, current, args.threshold)
+    print_comparison(rows, args.threshold)
+    return 1 if any(row['regression'] for row in rows) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
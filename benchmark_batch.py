@@ -0,0 +1,53 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from modules import PermutationCache
+from cryptosystem import HybridCryptosystem, generate_chaos_params
+from batch import encrypt_many, decrypt_many
+
+RECORD_COUNT = 20000
+RECORD_SIZE = 256
+
+def make_records(count, size):
+    return [os.urandom((size + 1) // 2).hex()[:size] for _ in range(count)]
+
+def time_serial(hybrid, records, chaos):
+    start = time.perf_counter()
+    for record in records:
+        hybrid.encrypt_container(record, chaos)
+    return time.perf_counter() - start
+
+def time_pool(hybrid, records, chaos, workers):
+    with ProcessPoolExecutor(workers) as executor:
+        # Warm the workers so process start-up is not measured
+        list(encrypt_many(hybrid, records[:workers * 4], [chaos] * (workers * 4), executor=executor, chunk_size=4))
+        start = time.perf_counter()
+        encrypted = list(encrypt_many(hybrid, records, [chaos] * len(records), executor=executor, max_workers=workers))
+        enc_time = time.perf_counter() - start
+        start = time.perf_counter()
+        decrypted = list(decrypt_many(hybrid, encrypted, executor=executor, max_workers=workers))
+        dec_time = time.perf_counter() - start
+    if decrypted != records:
+        raise AssertionError("Batch round trip mismatch")
+    return enc_time, dec_time
+
+def main():
+    print("Batch Encryption Benchmark: encrypt_many/decrypt_many over a process pool\n")
+    records = make_records(RECORD_COUNT, RECORD_SIZE)
+    # Workers keep a permutation cache too, so give the serial baseline the same advantage
+    hybrid = HybridCryptosystem(perm_cache=PermutationCache())
+    chaos = generate_chaos_params()
+    serial = time_serial(hybrid, records, chaos)
+    print(f"Serial encrypt: {RECORD_COUNT / serial:,.0f} records/sec\n")
+    print("| Workers | Encrypt rec/s | Decrypt rec/s | Speedup vs serial |")
+    print("|---------|---------------|---------------|-------------------|")
+    workers = 1
+    cpu_count = os.cpu_count() or 1
+    while workers <= cpu_count:
+        enc_time, dec_time = time_pool(hybrid, records, chaos, workers)
+        print(f"| {workers:<7} | {RECORD_COUNT / enc_time:>13,.0f} | {RECORD_COUNT / dec_time:>13,.0f} "
+              f"| {serial / enc_time:>16.2f}x |")
+        workers *= 2
+
+if __name__ == "__main__":
+    main()
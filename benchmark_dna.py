@@ -0,0 +1,48 @@
+import os
+import time
+from modules import DNAEncoder
+
+SIZES = [("1 KB", 1024), ("1 MB", 1024 * 1024), ("64 MB", 64 * 1024 * 1024)]
+
+# Reference implementation kept for byte-exact comparison
+def legacy_encode(data_bytes):
+    binary = ''.join(format(b, '08b') for b in data_bytes)
+    return ''.join(DNAEncoder.mapping[binary[i:i+2]] for i in range(0, len(binary), 2))
+
+def legacy_decode(dna_str):
+    binary = ''.join(DNAEncoder.reverse_mapping[nuc] for nuc in dna_str)
+    return bytes(int(binary[i:i+8], 2) for i in range(0, len(binary), 8))
+
+def iterations_for(size):
+    return max(1, (4 * 1024 * 1024) // size)
+
+def time_call(func, arg, iters):
+    start = time.perf_counter()
+    for _ in range(iters):
+        result = func(arg)
+    end = time.perf_counter()
+    return (end - start) / iters, result
+
+def compare(size, legacy_iters=None):
+    data = os.urandom(size)
+    iters = iterations_for(size)
+    legacy_iters = legacy_iters or iters
+    new_enc, dna = time_call(DNAEncoder.encode, data, iters)
+    new_dec, out = time_call(DNAEncoder.decode, dna, iters)
+    old_enc, old_dna = time_call(legacy_encode, data, legacy_iters)
+    old_dec, old_out = time_call(legacy_decode, old_dna, legacy_iters)
+    if dna != old_dna or out != data or old_out != data:
+        raise AssertionError(f"DNA encoder mismatch at size {size}")
+    return new_enc, new_dec, old_enc, old_dec
+
+def main():
+    print("DNAEncoder Benchmark: table-driven vs legacy string slicing\n")
+    print("| Size  | Legacy enc (s) | New enc (s) | Speedup | Legacy dec (s) | New dec (s) | Speedup |")
+    print("|-------|----------------|-------------|---------|----------------|-------------|---------|")
+    for label, size in SIZES:
+        new_enc, new_dec, old_enc, old_dec = compare(size, legacy_iters=1 if size > 1024 * 1024 else None)
+        print(f"| {label:<5} | {old_enc:>14.6f} | {new_enc:>11.6f} | {old_enc / new_enc:>6.1f}x "
+              f"| {old_dec:>14.6f} | {new_dec:>11.6f} | {old_dec / new_dec:>6.1f}x |")
+
+if __name__ == "__main__":
+    main()
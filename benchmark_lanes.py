@@ -0,0 +1,42 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from cryptosystem import HybridCryptosystem, generate_chaos_params
+
+DEFAULT_SIZE = 8 * 1024 * 1024
+LANE_COUNTS = [2, 4, 8]
+
+def time_lanes(plaintext, lanes, executor):
+    hybrid = HybridCryptosystem(lanes=lanes, executor=executor)
+    chaos = generate_chaos_params(lanes)
+    start = time.perf_counter()
+    result = hybrid.encrypt(plaintext, chaos)
+    enc_time = time.perf_counter() - start
+    start = time.perf_counter()
+    decrypted = hybrid.decrypt(result[0], *chaos)
+    dec_time = time.perf_counter() - start
+    if decrypted != plaintext:
+        raise AssertionError(f"Lane round trip mismatch (lanes={lanes})")
+    return enc_time, dec_time
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SIZE
+    print(f"Lane Benchmark: {size:,} byte message, serial vs thread vs process lanes\n")
+    plaintext = os.urandom((size + 1) // 2).hex()[:size]
+    baseline, _ = time_lanes(plaintext, 2, None)
+    print(f"Serial two-half encrypt: {baseline:.3f} s\n")
+    print("| Lanes | Executor | Encrypt (s) | Decrypt (s) | Speedup |")
+    print("|-------|----------|-------------|-------------|---------|")
+    for lanes in LANE_COUNTS:
+        for name, factory in (("serial", None), ("thread", ThreadPoolExecutor), ("process", ProcessPoolExecutor)):
+            executor = factory(lanes) if factory else None
+            try:
+                enc_time, dec_time = time_lanes(plaintext, lanes, executor)
+            finally:
+                if executor:
+                    executor.shutdown()
+            print(f"| {lanes:<5} | {name:<8} | {enc_time:>11.3f} | {dec_time:>11.3f} | {baseline / enc_time:>6.2f}x |")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import os
+import sys
+import time
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from Crypto.Cipher import AES
+from modules import AES_CBC, DNAEncoder, ChaosMapper, invert_indices
+from cryptosystem import (HybridCryptosystem, CHAOS_R_MIN, CHAOS_R_MAX, decrypt_lane, lane_slices, split_lanes,
+                          generate_chaos_params)
+from batch import batched
+from calculations import print_brute_force_table
+
+DEFAULT_MESSAGE_SIZE = 64
+DEFAULT_R_STEPS = 200
+DEFAULT_X0_STEPS = 200
+SEARCH_CHUNK_SIZE = 500
+# Nucleotides holding the last two AES blocks: the previous block acts as the CBC IV of the last one
+TAIL_NUCLEOTIDES = 2 * AES.block_size * 4
+
+def candidate_grid(r_steps, x0_steps):
+    # x0 stays strictly inside (0, 1): ChaosMapper treats 0 as "pick at random"
+    for i in range(r_steps):
+        r = CHAOS_R_MIN + (CHAOS_R_MAX - CHAOS_R_MIN) * i / max(r_steps - 1, 1)
+        for j in range(x0_steps):
+            yield r, (j + 1) / (x0_steps + 1)
+
+def tail_padding_ok(key, permuted, r, x0):
+    # Only the final two blocks are restored and decrypted; a wrong candidate
+    # fails the PKCS7 check here about 255 times out of 256
+    mapper = ChaosMapper(r, x0, len(permuted))
+    inverse = invert_indices(mapper.compute_indices())
+    tail = ''.join(permuted[i] for i in inverse[len(permuted) - TAIL_NUCLEOTIDES:])
+    blocks = DNAEncoder.decode(tail)
+    block = AES.new(key, AES.MODE_CBC, blocks[:AES.block_size]).decrypt(blocks[AES.block_size:])
+    pad_len = block[-1]
+    return 1 <= pad_len <= AES.block_size and block[-pad_len:] == bytes([pad_len]) * pad_len
+
+def search_chunk(key, permuted, candidates, expected=None):
+    # Runs in a worker process; returns (attempts, padding survivors, hits, busy ns)
+    start = time.perf_counter_ns()
+    aes = AES_CBC(key)
+    survivors = 0
+    hits = []
+    for r, x0 in candidates:
+        if not tail_padding_ok(key, permuted, r, x0):
+            continue
+        survivors += 1
+        plain = decrypt_lane(aes, permuted, r, x0)
+        if plain is not None and (expected is None or plain == expected):
+            hits.append((r, x0))
+    return len(candidates), survivors, hits, time.perf_counter_ns() - start
+
+def make_target(size=DEFAULT_MESSAGE_SIZE):
+    # Attacker model: AES keys known, chaos parameters unknown; attack the first lane
+    hybrid = HybridCryptosystem()
+    plaintext = os.urandom((size + 1) // 2).hex()[:size]
+    chaos = generate_chaos_params(hybrid.lanes)
+    merged = hybrid.encrypt(plaintext, chaos)[0]
+    permuted = split_lanes(merged, hybrid.lanes)[0]
+    expected = lane_slices(plaintext, hybrid.lanes)[0].encode()
+    return hybrid.aes_lanes[0].key, permuted, expected, chaos[:2]
+
+def run_search(key, permuted, candidates, expected=None, executor=None, max_workers=None,
+               chunk_size=SEARCH_CHUNK_SIZE):
+    workers = max_workers or os.cpu_count() or 1
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(workers)
+    try:
+        # Warm the workers so process start-up is not counted as search time
+        list(executor.map(search_chunk, [key] * workers, [permuted] * workers, [[]] * workers))
+        start = time.perf_counter()
+        futures = [executor.submit(search_chunk, key, permuted, chunk, expected)
+                   for chunk in batched(candidates, chunk_size)]
+        results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - start
+    finally:
+        if own_executor:
+            executor.shutdown()
+    attempts = sum(result[0] for result in results)
+    busy_ns = sum(result[3] for result in results)
+    return {
+        'attempts': attempts,
+        'padding_survivors': sum(result[1] for result in results),
+        'hits': [hit for result in results for hit in result[2]],
+        'elapsed_s': elapsed,
+        'workers': workers,
+        'attempts_per_second': attempts / elapsed if elapsed else 0.0,
+        'attempts_per_second_per_core': attempts / (busy_ns / 1e9) if busy_ns else 0.0,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measured chaos-parameter brute force over a process pool")
+    parser.add_argument('--size', type=int, default=DEFAULT_MESSAGE_SIZE, help="plaintext length of the target")
+    parser.add_argument('--r-steps', type=int, default=DEFAULT_R_STEPS)
+    parser.add_argument('--x0-steps', type=int, default=DEFAULT_X0_STEPS)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=SEARCH_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    key, permuted, expected, true_params = make_target(args.size)
+    candidates = list(candidate_grid(args.r_steps, args.x0_steps))
+    # Plant the real parameters so the run also shows the search finds them
+    candidates.insert(random.randrange(len(candidates) + 1), true_params)
+    report = run_search(key, permuted, candidates, expected, max_workers=args.workers, chunk_size=args.chunk_size)
+
+    print(f"Candidates tried: {report['attempts']:,} on {report['workers']} worker(s) in {report['elapsed_s']:.2f} s")
+    print(f"Passed the final-block padding check: {report['padding_survivors']:,} "
+          f"({report['padding_survivors'] / report['attempts'] * 100:.2f}%)")
+    print(f"Recovered parameters: {report['hits']} (true: {true_params})")
+    print(f"Measured rate: {report['attempts_per_second_per_core']:,.0f} attempts/sec per core, "
+          f"{report['attempts_per_second']:,.0f} attempts/sec total\n")
+    print_brute_force_table(report['attempts_per_second'])
+    return 0 if true_params in report['hits'] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -29,14 +29,9 @@ def format_time(seconds):
     else:
         return f"{seconds:,.2f} seconds"
 
-def main():
-    print("Brute-force Attack Simulation Comparison")
-    print("Key lengths: 8, 16, 32, 64, 128, 256, Hybrid (AES-256+chaos)")
-    # User input
-    rate = float(input("How many brute force attempts per second? (e.g., 1e9 means 1 billion/sec): "))
-    
+def print_brute_force_table(rate):
     key_lengths = [8, 16, 32, 64, 128, 256]
-    print("\n| Key bits | Cipher | Keyspace | Time to Exhaust Keyspace |")
+    print("| Key bits | Cipher | Keyspace | Time to Exhaust Keyspace |")
     print("|----------|--------|-----------|--------------------------|")
     for bits in key_lengths:
         total_keys, seconds, years = brute_force_stats(bits, rate)
@@ -54,5 +49,13 @@ def main():
 
     print("\n*Hybrid effective key bits includes AES-256 key plus 4x30-bit chaos parameters.")
 
+def main():
+    print("Brute-force Attack Simulation Comparison")
+    print("Key lengths: 8, 16, 32, 64, 128, 256, Hybrid (AES-256+chaos)")
+    # User input; bruteforce.py measures the rate of real trial decryptions on this machine instead
+    rate = float(input("How many brute force attempts per second? (e.g., 1e9 means 1 billion/sec): "))
+    print()
+    print_brute_force_table(rate)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
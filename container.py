@@ -0,0 +1,116 @@
+import hmac
+import struct
+import hashlib
+
+CONTAINER_MAGIC = b'4PCX'
+CONTAINER_VERSION = 1
+# magic, version, flags, lane count, parameter set ID
+CONTAINER_HEADER = struct.Struct('>4sBBHI')
+LANE_LENGTH = struct.Struct('>I')
+# Flag bit: an HMAC-SHA256 tag follows the last lane. It covers everything before it plus
+# the chaos parameters, which are never stored, so wrong parameters fail the MAC check
+FLAG_AUTHENTICATED = 0x01
+MAC_SIZE = 32
+MAC_KEY_MIN_SIZE = 16
+
+class EnvelopeError(ValueError):
+    # Why a container was refused, as a machine-readable code: malformed, unauthenticated,
+    # missing_key, bad_mac, invalid_params or decrypt_failed
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+    def __reduce__(self):
+        # Refused containers come back from pool workers inside a DecryptResult
+        return type(self), (self.code, str(self))
+
+def params_fingerprint(chaos_params):
+    # Exact float64 bytes of (r_1, x0_1, ..., r_N, x0_N); only ever hashed under the MAC key
+    return struct.pack(f'>{len(chaos_params)}d', *chaos_params)
+
+def pack_container(lane_bytes, param_id=0, flags=0, out=None, mac_key=None, chaos_params=()):
+    # Each lane holds the permuted nucleotides packed 2 bits each
+    if mac_key is not None:
+        flags |= FLAG_AUTHENTICATED
+    header = CONTAINER_HEADER.pack(CONTAINER_MAGIC, CONTAINER_VERSION, flags, len(lane_bytes), param_id)
+    lengths = b''.join(LANE_LENGTH.pack(len(lane)) for lane in lane_bytes)
+    pieces = [header, lengths, *lane_bytes]
+    if mac_key is not None:
+        # The tag covers the header too, so the parameter set ID and flags cannot be swapped
+        mac = hmac.new(mac_key, digestmod=hashlib.sha256)
+        for piece in pieces:
+            mac.update(piece)
+        mac.update(params_fingerprint(chaos_params))
+        pieces.append(mac.digest())
+    if out is None:
+        return b''.join(pieces)
+    # Reuse the caller's buffer: resize it once, then copy every piece into place
+    total = sum(len(piece) for piece in pieces)
+    if len(out) < total:
+        out.extend(bytes(total - len(out)))
+    else:
+        del out[total:]
+    offset = 0
+    with memoryview(out) as view:
+        for piece in pieces:
+            view[offset:offset + len(piece)] = piece
+            offset += len(piece)
+    return out
+
+def is_container(data):
+    return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:4]) == CONTAINER_MAGIC
+
+def read_container_header(data):
+    if len(data) < CONTAINER_HEADER.size:
+        raise ValueError("Container too short for header")
+    magic, version, flags, lanes, param_id = CONTAINER_HEADER.unpack_from(data)
+    if magic != CONTAINER_MAGIC:
+        raise ValueError("Not a 4P ciphertext container")
+    if version != CONTAINER_VERSION:
+        raise ValueError(f"Unsupported container version {version}")
+    return version, flags, lanes, param_id
+
+def authenticate_container(data, mac_key=None, chaos_params=()):
+    # Runs before anything is unpermuted or decoded, so a forged or corrupted container, or
+    # the wrong chaos parameters, cost one HMAC pass. With a MAC key configured, untagged
+    # containers are refused too
+    try:
+        _, flags, _, _ = read_container_header(data)
+    except ValueError as e:
+        raise EnvelopeError('malformed', str(e)) from None
+    if not flags & FLAG_AUTHENTICATED:
+        if mac_key is not None:
+            raise EnvelopeError('unauthenticated', "Container has no MAC but a MAC key is configured")
+        return
+    if mac_key is None:
+        raise EnvelopeError('missing_key', "Container is authenticated but no MAC key is configured")
+    view = memoryview(data)
+    if len(view) < CONTAINER_HEADER.size + MAC_SIZE:
+        raise EnvelopeError('malformed', "Container too short for its MAC")
+    mac = hmac.new(mac_key, view[:-MAC_SIZE], hashlib.sha256)
+    mac.update(params_fingerprint(chaos_params))
+    if not hmac.compare_digest(mac.digest(), bytes(view[-MAC_SIZE:])):
+        raise EnvelopeError('bad_mac', "Container MAC does not match (tampered, or wrong chaos parameters)")
+
+def unpack_container(data):
+    view = memoryview(data)
+    _, flags, lanes, param_id = read_container_header(view)
+    if flags & FLAG_AUTHENTICATED:
+        # The tag is not checked here, see authenticate_container
+        if len(view) < CONTAINER_HEADER.size + MAC_SIZE:
+            raise ValueError("Container too short for its MAC")
+        view = view[:-MAC_SIZE]
+    offset = CONTAINER_HEADER.size
+    lengths = []
+    for _ in range(lanes):
+        if len(view) < offset + LANE_LENGTH.size:
+            raise ValueError("Container truncated in lane table")
+        lengths.append(LANE_LENGTH.unpack_from(view, offset)[0])
+        offset += LANE_LENGTH.size
+    if len(view) != offset + sum(lengths):
+        raise ValueError(f"Container body is {len(view) - offset} bytes, lane table says {sum(lengths)}")
+    lane_bytes = []
+    for length in lengths:
+        lane_bytes.append(view[offset:offset + length])
+        offset += length
+    return param_id, flags, lane_bytes
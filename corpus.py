@@ -0,0 +1,232 @@
+import os
+import sys
+import csv
+import json
+import math
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from cryptosystem import HybridCryptosystem
+from batch import get_worker_system, system_keys, batched
+from randomness import analyze
+from benchmark import percentile
+
+CORPUS_CHUNK_SIZE = 16
+DEFAULT_MAX_FILE_SIZE = 64 * 1024 * 1024
+FORMATS = ('jsonl', 'csv')
+STAT_KEYS = ('entropy', 'chi_square', 'serial_correlation', 'monte_carlo_pi')
+FIELDS = (('path', 'size', 'ciphertext_size')
+          + tuple(f'pt_{key}' for key in STAT_KEYS) + tuple(f'ct_{key}' for key in STAT_KEYS)
+          + ('encrypt_ms', 'decrypt_ms', 'ok', 'error'))
+NUMERIC_FIELDS = set(FIELDS) - {'path', 'ok', 'error'}
+
+def walk_files(root, skip=()):
+    # Sorted walk so runs over the same tree visit files in the same order
+    skip = {os.path.abspath(path) for path in skip}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            if os.path.abspath(path) not in skip and os.path.isfile(path):
+                yield os.path.relpath(path, root)
+
+def analyze_one(hybrid, root, relpath, max_size):
+    record = dict.fromkeys(FIELDS)
+    record.update(path=relpath, ok=False, error='')
+    try:
+        size = os.path.getsize(os.path.join(root, relpath))
+        record['size'] = size
+        if size > max_size:
+            record['error'] = f"skipped, larger than {max_size} bytes"
+            return record
+        with open(os.path.join(root, relpath), 'rb') as f:
+            data = f.read()
+        start = time.perf_counter_ns()
+        container, *params = hybrid.encrypt_bytes(data)
+        record['encrypt_ms'] = (time.perf_counter_ns() - start) / 1e6
+        if container is None:
+            record['error'] = "encryption failed"
+            return record
+        start = time.perf_counter_ns()
+        plain = hybrid.decrypt_bytes(container, *params)
+        record['decrypt_ms'] = (time.perf_counter_ns() - start) / 1e6
+        record['ciphertext_size'] = len(container)
+        for prefix, stats in (('pt', analyze(data)), ('ct', analyze(container))):
+            for key in STAT_KEYS:
+                # Serial correlation and Monte Carlo pi are undefined for very short files; NaN is not JSON
+                record[f'{prefix}_{key}'] = stats[key] if math.isfinite(stats[key]) else None
+        record['ok'] = plain == data
+        if not record['ok']:
+            record['error'] = "round trip mismatch"
+    except OSError as e:
+        record['error'] = str(e)
+    return record
+
+def analyze_chunk(keys, root, relpaths, max_size):
+    # Runs in a worker process; the worker reads the files itself so no file data is pickled
+    hybrid = get_worker_system(keys)
+    return [analyze_one(hybrid, root, relpath, max_size) for relpath in relpaths]
+
+def output_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return 'csv' if path.endswith('.csv') else 'jsonl'
+
+def parse_csv_record(row):
+    record = dict(row)
+    for key in NUMERIC_FIELDS:
+        value = record.get(key)
+        record[key] = float(value) if value not in (None, '') else None
+    record['ok'] = record.get('ok') == 'True'
+    return record
+
+def read_records(path, fmt=None):
+    fmt = output_format(path, fmt)
+    with open(path, newline='') as f:
+        if fmt == 'csv':
+            return [parse_csv_record(row) for row in csv.DictReader(f)]
+        return [json.loads(line) for line in f if line.strip()]
+
+def recover_output(path, fmt):
+    # After a crash the last line may be half written: cut the file back to its last
+    # complete line and return the paths already analyzed
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'rb+') as f:
+        data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            f.truncate(end)
+    records = read_records(path, fmt)
+    return {record['path'] for record in records}
+
+class RecordWriter:
+    def __init__(self, path, fmt):
+        self.fmt = fmt
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'a', newline='')
+        if fmt == 'csv':
+            self.writer = csv.DictWriter(self.file, FIELDS)
+            if new:
+                self.writer.writeheader()
+
+    def write(self, record):
+        if self.fmt == 'csv':
+            self.writer.writerow(record)
+        else:
+            self.file.write(json.dumps(record, allow_nan=False) + '\n')
+        # Each record reaches the file as it completes, so a crash loses at most the line in flight
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def run_corpus(root, output, fmt=None, lanes=2, executor=None, max_workers=None,
+               chunk_size=CORPUS_CHUNK_SIZE, max_size=DEFAULT_MAX_FILE_SIZE, max_pending=None):
+    fmt = output_format(output, fmt)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown output format {fmt!r}, expected one of {FORMATS}")
+    done = recover_output(output, fmt)
+    pending_paths = (path for path in walk_files(root, skip=[output]) if path not in done)
+    keys = system_keys(HybridCryptosystem(lanes=lanes))
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers)
+    window = max_pending or 2 * (max_workers or os.cpu_count() or 1)
+    writer = RecordWriter(output, fmt)
+    written = 0
+    pending = set()
+
+    def drain(futures):
+        nonlocal written
+        for future in futures:
+            for record in future.result():
+                writer.write(record)
+                written += 1
+
+    try:
+        for chunk in batched(pending_paths, chunk_size):
+            pending.add(executor.submit(analyze_chunk, keys, root, chunk, max_size))
+            # Bounded window; records are written in completion order
+            if len(pending) >= window:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                drain(finished)
+        drain(wait(pending).done)
+        pending = set()
+    finally:
+        for future in pending:
+            future.cancel()
+        writer.close()
+        if own_executor:
+            executor.shutdown()
+    return {'resumed': len(done), 'written': written}
+
+def summarize_records(records):
+    analyzed = [record for record in records if record['ok']]
+    summary = {
+        'files': len(records),
+        'analyzed': len(analyzed),
+        'failed': len(records) - len(analyzed),
+        'plaintext_bytes': sum(record['size'] for record in analyzed),
+        'ciphertext_bytes': sum(record['ciphertext_size'] for record in analyzed),
+    }
+    if not analyzed:
+        return summary
+    encrypt_s = sum(record['encrypt_ms'] for record in analyzed) / 1e3
+    decrypt_s = sum(record['decrypt_ms'] for record in analyzed) / 1e3
+    summary['encrypt_mb_s'] = summary['plaintext_bytes'] / encrypt_s / 1e6 if encrypt_s else 0.0
+    summary['decrypt_mb_s'] = summary['plaintext_bytes'] / decrypt_s / 1e6 if decrypt_s else 0.0
+    for key in ('encrypt_ms', 'decrypt_ms'):
+        ordered = sorted(record[key] for record in analyzed)
+        summary[key] = {'p50': percentile(ordered, 0.5), 'p95': percentile(ordered, 0.95), 'max': ordered[-1]}
+    for prefix in ('pt', 'ct'):
+        ordered = sorted(record[f'{prefix}_entropy'] for record in analyzed)
+        weight = summary['plaintext_bytes'] if prefix == 'pt' else summary['ciphertext_bytes']
+        size_key = 'size' if prefix == 'pt' else 'ciphertext_size'
+        summary[f'{prefix}_entropy'] = {
+            'mean': sum(ordered) / len(ordered),
+            'median': percentile(ordered, 0.5),
+            'min': ordered[0],
+            # Weighted by size so a few large files are not drowned out by many tiny ones
+            'size_weighted': sum(r[f'{prefix}_entropy'] * r[size_key] for r in analyzed) / weight if weight else 0.0,
+        }
+    return summary
+
+def print_summary(summary):
+    print(f"Files: {summary['files']:,} ({summary['analyzed']:,} analyzed, {summary['failed']:,} failed or skipped)")
+    print(f"Plaintext: {summary['plaintext_bytes']:,} bytes, ciphertext: {summary['ciphertext_bytes']:,} bytes")
+    if not summary['analyzed']:
+        return
+    print(f"Encrypt: {summary['encrypt_mb_s']:.2f} MB/s, p50 {summary['encrypt_ms']['p50']:.3f} ms, "
+          f"p95 {summary['encrypt_ms']['p95']:.3f} ms")
+    print(f"Decrypt: {summary['decrypt_mb_s']:.2f} MB/s, p50 {summary['decrypt_ms']['p50']:.3f} ms, "
+          f"p95 {summary['decrypt_ms']['p95']:.3f} ms")
+    for prefix, label in (('pt', 'Plaintext'), ('ct', 'Ciphertext')):
+        entropy = summary[f'{prefix}_entropy']
+        print(f"{label} entropy: mean {entropy['mean']:.4f}, median {entropy['median']:.4f}, "
+              f"size-weighted {entropy['size_weighted']:.4f} bits/byte")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Encrypt and analyze every file under a directory")
+    parser.add_argument('root')
+    parser.add_argument('-o', '--output', required=True, help="results file (.csv or .jsonl), resumed if it exists")
+    parser.add_argument('--format', choices=FORMATS, default=None)
+    parser.add_argument('--lanes', type=int, default=2)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=CORPUS_CHUNK_SIZE)
+    parser.add_argument('--max-size', type=int, default=DEFAULT_MAX_FILE_SIZE, help="skip larger files")
+    parser.add_argument('--summary', help="also write the aggregate summary as JSON to this path")
+    args = parser.parse_args(argv)
+
+    progress = run_corpus(args.root, args.output, args.format, args.lanes, max_workers=args.workers,
+                          chunk_size=args.chunk_size, max_size=args.max_size)
+    print(f"Resumed past {progress['resumed']:,} files, analyzed {progress['written']:,} more\n")
+    summary = summarize_records(read_records(args.output, args.format))
+    print_summary(summary)
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,10 @@
 
-from modules import AES_CBC, DNAEncoder, ChaosMapper
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from modules import AES_CBC, DNAEncoder, ChaosMapper, LazyIndices, CIPHER_BACKENDS
+from container import (pack_container, unpack_container, is_container, authenticate_container, EnvelopeError,
+                       MAC_KEY_MIN_SIZE)
+from profiling import timed
 
 CHAOS_R_MIN = 3.57
 CHAOS_R_MAX = 4.0
@@ -8,10 +13,40 @@ CHAOS_X0_MAX = 1.0
 
 DNA_SYMBOLS = ('A', 'T', 'C', 'G')
 
+DEFAULT_LANES = 2
+LANE_LENGTH_MARK = '#'
+STREAM_CHUNK_SIZE = 64 * 1024
+# Encrypted in front of every lane of a stream frame: kind, frame number, plaintext offset.
+# The end frame has no payload and its offset is the total length
+STREAM_FRAME = struct.Struct('>BQQ')
+FRAME_DATA = 0
+FRAME_END = 1
+
 def validate_chaos_param(label, value, min_val, max_val):
     if not (min_val <= value <= max_val):
         raise ValueError(f"{label}={value} out of bounds [{min_val}, {max_val}]")
 
+def lane_label(lane, lanes):
+    if lanes == 2:
+        return ('left', 'right')[lane]
+    return f"lane{lane}"
+
+def validate_chaos_params(*chaos_params):
+    if len(chaos_params) % 2:
+        raise ValueError(f"Expected (r, x0) pairs, got {len(chaos_params)} chaos parameters")
+    lanes = len(chaos_params) // 2
+    for lane in range(lanes):
+        label = lane_label(lane, lanes)
+        validate_chaos_param(f'r_{label}', chaos_params[2 * lane], CHAOS_R_MIN, CHAOS_R_MAX)
+        validate_chaos_param(f'x0_{label}', chaos_params[2 * lane + 1], CHAOS_X0_MIN, CHAOS_X0_MAX)
+
+def generate_chaos_params(lanes=DEFAULT_LANES):
+    params = []
+    for _ in range(lanes):
+        mapper = ChaosMapper()
+        params += [mapper.r, mapper.x0]
+    return tuple(params)
+
 def validate_dna_seq(seq):
     for c in seq:
         if c not in DNA_SYMBOLS:
@@ -20,78 +55,376 @@ def validate_dna_seq(seq):
 def handle_exception(action, exception):
     print(f"[cryptosystem.py] {action} error: {exception}")
 
+def lane_slices(seq, lanes):
+    # lanes=2 reproduces the original half split at len // 2
+    n = len(seq)
+    return [seq[n * i // lanes:n * (i + 1) // lanes] for i in range(lanes)]
+
+def join_lanes(parts):
+    # Equal lanes keep the plain concatenation that lane_slices splits back. Lanes that pad
+    # to different lengths get their DNA lengths in front as '#len,len,...#' (DNA never holds '#')
+    merged = ''.join(parts)
+    if [len(part) for part in lane_slices(merged, len(parts))] == [len(part) for part in parts]:
+        return merged
+    return LANE_LENGTH_MARK + ','.join(str(len(part)) for part in parts) + LANE_LENGTH_MARK + merged
+
+def split_lanes(merged, lanes):
+    if not merged.startswith(LANE_LENGTH_MARK):
+        return lane_slices(merged, lanes)
+    header, mark, body = merged[1:].partition(LANE_LENGTH_MARK)
+    try:
+        lengths = [int(length) for length in header.split(',')] if mark else []
+    except ValueError:
+        lengths = []
+    if len(lengths) != lanes or min(lengths) < 0 or sum(lengths) != len(body):
+        raise ValueError(f"Malformed lane lengths {header[:64]!r} for {lanes} lanes of {len(body)} symbols")
+    parts = []
+    start = 0
+    for length in lengths:
+        parts.append(body[start:start + length])
+        start += length
+    return parts
+
+def encrypt_lane(aes, data, r=None, x0=None, perm_cache=None):
+    ct = timed('aes_encrypt', aes.encrypt, data, nbytes=len(data))
+    # DNA encoding
+    dna = timed('dna_encode', DNAEncoder.encode, ct, nbytes=len(ct))
+    timed('validate_dna', validate_dna_seq, dna, nbytes=len(dna))
+    # Chaos permutation
+    mapper = ChaosMapper(r=r, x0=x0, length=len(dna), cache=perm_cache)
+    indices = mapper.get_indices()
+    permuted = timed('permute', ChaosMapper.permute, dna, indices, nbytes=len(dna))
+    # Indices are not returned: callers rebuild them lazily from (r, x0, length) if needed
+    return permuted, mapper.r, mapper.x0
+
+def decrypt_lane(aes, permuted, r, x0, perm_cache=None):
+    timed('validate_dna', validate_dna_seq, permuted, nbytes=len(permuted))
+    mapper = ChaosMapper(r, x0, len(permuted), cache=perm_cache)
+    dna = mapper.restore(permuted)
+    ct = timed('dna_decode', DNAEncoder.decode, dna, nbytes=len(dna))
+    return timed('aes_decrypt', aes.decrypt, ct, nbytes=len(ct))
+
+def encrypt_lane_packed(aes, data, r=None, x0=None, perm_cache=None):
+    # Same stages as encrypt_lane, but nucleotides stay 2-bit symbols instead of a string
+    ct = timed('aes_encrypt', aes.encrypt, data, nbytes=len(data))
+    symbols = timed('dna_encode', DNAEncoder.to_symbols, ct, nbytes=len(ct))
+    mapper = ChaosMapper(r=r, x0=x0, length=len(symbols), cache=perm_cache)
+    indices = mapper.get_indices()
+    permuted = timed('permute', ChaosMapper.permute, symbols, indices, nbytes=len(symbols))
+    return timed('dna_pack', DNAEncoder.from_symbols, permuted, nbytes=len(permuted)), mapper.r, mapper.x0
+
+def unpermute_lane_packed(permuted, r, x0, perm_cache=None):
+    # Returns the lane's AES ciphertext so the caller can decrypt it into its own buffer
+    symbols = timed('dna_unpack', DNAEncoder.to_symbols, permuted, nbytes=len(permuted))
+    mapper = ChaosMapper(r, x0, len(symbols), cache=perm_cache)
+    restored = mapper.restore(symbols)
+    return timed('dna_decode', DNAEncoder.from_symbols, restored, nbytes=len(restored))
+
+def iter_chunks(source, chunk_size):
+    if hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield bytes(chunk)
+    buffer = bytearray()
+    for piece in source:
+        buffer += piece
+        while len(buffer) >= chunk_size:
+            yield bytes(buffer[:chunk_size])
+            del buffer[:chunk_size]
+    if buffer:
+        yield bytes(buffer)
+
+def frame_header(lanes):
+    # Frame header: DNA length of every permuted lane
+    return struct.Struct(f'>{lanes}I')
+
+def iter_frames(source, lanes):
+    header = frame_header(lanes)
+    buffer = bytearray()
+    for piece in iter_chunks(source, STREAM_CHUNK_SIZE):
+        buffer += piece
+        while len(buffer) >= header.size:
+            lengths = header.unpack_from(buffer)
+            end = header.size + sum(lengths)
+            if len(buffer) < end:
+                break
+            body = buffer[header.size:end].decode('ascii')
+            del buffer[:end]
+            parts = []
+            start = 0
+            for length in lengths:
+                parts.append(body[start:start + length])
+                start += length
+            yield parts
+    if buffer:
+        raise ValueError(f"Truncated frame: {len(buffer)} trailing bytes")
+
+def check_frame(parts, number, offset):
+    # Every lane must carry the same prefix, naming the frame expected at this point of the stream
+    prefixes = {STREAM_FRAME.unpack_from(part) if len(part) >= STREAM_FRAME.size else None for part in parts}
+    if len(prefixes) != 1 or None in prefixes:
+        raise ValueError(f"Frame {number}: lanes disagree on their position")
+    kind, frame_number, frame_offset = prefixes.pop()
+    if kind not in (FRAME_DATA, FRAME_END) or (frame_number, frame_offset) != (number, offset):
+        raise ValueError(f"Frame {frame_number} at offset {frame_offset} out of order, "
+                         f"expected frame {number} at offset {offset}")
+    return kind
+
+class EncryptResult:
+    # What HybridCryptosystem.encrypt returns. Iterating or indexing still gives the old
+    # (merged, *indices, *params) tuple, i.e. the 7-tuple for two lanes
+    __slots__ = ('ciphertext', 'params', 'indices')
+
+    def __init__(self, ciphertext, params, indices):
+        self.ciphertext = ciphertext
+        self.params = tuple(params)
+        self.indices = tuple(indices)
+
+    @property
+    def lanes(self):
+        return len(self.indices)
+
+    def __iter__(self):
+        return iter((self.ciphertext, *self.indices, *self.params))
+
+    def __len__(self):
+        return 1 + 3 * len(self.indices)
+
+    def __getitem__(self, item):
+        return tuple(self)[item]
+
+    def __repr__(self):
+        return f"EncryptResult(lanes={self.lanes}, ciphertext_length={len(self.ciphertext or '')}, params={self.params})"
+
+class DecryptResult:
+    # What HybridCryptosystem.open_envelope returns: the plaintext, or an EnvelopeError
+    # whose code says why the container was refused
+    __slots__ = ('plaintext', 'error')
+
+    def __init__(self, plaintext=None, error=None):
+        self.plaintext = plaintext
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def code(self):
+        return None if self.error is None else self.error.code
+
+    def __repr__(self):
+        if self.error is not None:
+            return f"DecryptResult(error={self.error.code!r}, message={str(self.error)!r})"
+        return f"DecryptResult(plaintext_length={len(self.plaintext)})"
+
 class HybridCryptosystem:
-    def __init__(self):
-        self.aes_left = AES_CBC()
-        self.aes_right = AES_CBC()
+    def __init__(self, perm_cache=None, lanes=DEFAULT_LANES, executor=None, cipher=AES_CBC, mac_key=None):
+        if lanes < 1:
+            raise ValueError(f"lanes={lanes} must be at least 1")
+        if mac_key is not None and len(mac_key) < MAC_KEY_MIN_SIZE:
+            raise ValueError(f"MAC key must be at least {MAC_KEY_MIN_SIZE} bytes, got {len(mac_key)}")
+        if isinstance(cipher, str):
+            if cipher not in CIPHER_BACKENDS:
+                raise ValueError(f"Unknown cipher backend {cipher!r}, expected one of {sorted(CIPHER_BACKENDS)}")
+            cipher = CIPHER_BACKENDS[cipher]
+        self.lanes = lanes
+        # cipher is any factory returning an object with the AES_CBC interface
+        self.aes_lanes = [cipher() for _ in range(lanes)]
+        self.perm_cache = perm_cache
+        self.executor = executor
+        # With a MAC key, containers are sealed on encrypt and must verify before decrypt
+        self.mac_key = mac_key
+
+    @property
+    def aes_left(self):
+        return self.aes_lanes[0]
+
+    @aes_left.setter
+    def aes_left(self, aes):
+        self.aes_lanes[0] = aes
+
+    @property
+    def aes_right(self):
+        return self.aes_lanes[-1]
+
+    @aes_right.setter
+    def aes_right(self, aes):
+        self.aes_lanes[-1] = aes
 
     def split(self, plaintext):
         if not isinstance(plaintext, str):
             raise TypeError("Plaintext must be a string")
-        split_idx = len(plaintext) // 2
-        return plaintext[:split_idx], plaintext[split_idx:]
+        return lane_slices(plaintext, self.lanes)
 
-    def merge(self, left, right):
-        if not (isinstance(left, str) and isinstance(right, str)):
+    def merge(self, *parts):
+        if not all(isinstance(part, str) for part in parts):
             raise TypeError("Merge inputs must be strings")
-        return left + right
+        return ''.join(parts)
+
+    def lane_params(self, chaos_params, allow_random=False):
+        # Only encryption may leave the parameters out: every lane then draws its own at random
+        chaos_params = chaos_params or ()
+        if not chaos_params and allow_random:
+            return [(None, None)] * self.lanes
+        if len(chaos_params) != 2 * self.lanes:
+            raise ValueError(f"Expected {2 * self.lanes} chaos parameters for {self.lanes} lanes, got {len(chaos_params)}")
+        validate_chaos_params(*chaos_params)
+        return [(chaos_params[2 * i], chaos_params[2 * i + 1]) for i in range(self.lanes)]
+
+    def run_lanes(self, func, jobs):
+        if self.executor is None:
+            return [func(*job, self.perm_cache) for job in jobs]
+        cache = self.perm_cache
+        if isinstance(self.executor, ProcessPoolExecutor):
+            # The cache holds a lock and lives in this process, and memoryviews cannot be pickled
+            cache = None
+            jobs = [tuple(bytes(arg) if isinstance(arg, memoryview) else arg for arg in job) for job in jobs]
+        futures = [self.executor.submit(func, *job, cache) for job in jobs]
+        return [future.result() for future in futures]
+
+    def encrypt_lanes(self, parts, chaos_override=None, lane_func=encrypt_lane):
+        params = self.lane_params(chaos_override, allow_random=True)
+        jobs = [(aes, part, r, x0) for aes, part, (r, x0) in zip(self.aes_lanes, parts, params)]
+        return self.run_lanes(lane_func, jobs)
+
+    def decrypt_lanes(self, permuted_parts, chaos_params):
+        params = self.lane_params(chaos_params)
+        jobs = [(aes, part, r, x0) for aes, part, (r, x0) in zip(self.aes_lanes, permuted_parts, params)]
+        parts = self.run_lanes(decrypt_lane, jobs)
+        if any(part is None for part in parts):
+            raise ValueError("AES decryption failed (wrong key or parameters)")
+        return parts
 
     def encrypt(self, plaintext, chaos_override=None):
         try:
-            left, right = self.split(plaintext)
-            ct_left = self.aes_left.encrypt(left.encode())
-            ct_right = self.aes_right.encrypt(right.encode())
-            # DNA encoding
-            dna_left = DNAEncoder.encode(ct_left)
-            dna_right = DNAEncoder.encode(ct_right)
-            validate_dna_seq(dna_left)
-            validate_dna_seq(dna_right)
-            # Chaos permutation
-            if chaos_override:
-                r_l, x0_l, r_r, x0_r = chaos_override
-                validate_chaos_param('r_left', r_l, CHAOS_R_MIN, CHAOS_R_MAX)
-                validate_chaos_param('x0_left', x0_l, CHAOS_X0_MIN, CHAOS_X0_MAX)
-                validate_chaos_param('r_right', r_r, CHAOS_R_MIN, CHAOS_R_MAX)
-                validate_chaos_param('x0_right', x0_r, CHAOS_X0_MIN, CHAOS_X0_MAX)
-                mapper_left = ChaosMapper(r=r_l, x0=x0_l, length=len(dna_left))
-                mapper_right = ChaosMapper(r=r_r, x0=x0_r, length=len(dna_right))
-            else:
-                mapper_left = ChaosMapper(length=len(dna_left))
-                mapper_right = ChaosMapper(length=len(dna_right))
-            indices_left = mapper_left.get_indices()
-            indices_right = mapper_right.get_indices()
-            permuted_left = ChaosMapper.permute(dna_left, indices_left)
-            permuted_right = ChaosMapper.permute(dna_right, indices_right)
-            merged = self.merge(permuted_left, permuted_right)
-            return merged, indices_left, indices_right, mapper_left.r, mapper_left.x0, mapper_right.r, mapper_right.x0
+            parts = self.split(plaintext)
+            results = self.encrypt_lanes([part.encode() for part in parts], chaos_override)
+            merged = join_lanes([result[0] for result in results])
+            indices = [LazyIndices(r, x0, len(permuted), self.perm_cache) for permuted, r, x0 in results]
+            params = [value for result in results for value in result[1:]]
+            return EncryptResult(merged, params, indices)
         except Exception as e:
             handle_exception("Encryption", e)
-            return None, None, None, None, None, None, None
+            return EncryptResult(None, (None,) * (2 * self.lanes), (None,) * self.lanes)
 
-    def decrypt(self, merged, r_left, x0_left, r_right, x0_right):
+    def decrypt(self, merged, *chaos_params):
         try:
-            split_idx = len(merged) // 2
-            permuted_left = merged[:split_idx]
-            permuted_right = merged[split_idx:]
-            validate_dna_seq(permuted_left)
-            validate_dna_seq(permuted_right)
-            validate_chaos_param('r_left', r_left, CHAOS_R_MIN, CHAOS_R_MAX)
-            validate_chaos_param('x0_left', x0_left, CHAOS_X0_MIN, CHAOS_X0_MAX)
-            validate_chaos_param('r_right', r_right, CHAOS_R_MIN, CHAOS_R_MAX)
-            validate_chaos_param('x0_right', x0_right, CHAOS_X0_MIN, CHAOS_X0_MAX)
-            mapper_left = ChaosMapper(r_left, x0_left, len(permuted_left))
-            mapper_right = ChaosMapper(r_right, x0_right, len(permuted_right))
-            indices_left = mapper_left.get_indices()
-            indices_right = mapper_right.get_indices()
-            unpermuted_left = ChaosMapper.unpermute(permuted_left, indices_left)
-            unpermuted_right = ChaosMapper.unpermute(permuted_right, indices_right)
-            ct_left = DNAEncoder.decode(unpermuted_left)
-            ct_right = DNAEncoder.decode(unpermuted_right)
-            left = self.aes_left.decrypt(ct_left)
-            right = self.aes_right.decrypt(ct_right)
-            if left is None or right is None:
-                raise ValueError("AES decryption failed (wrong key or parameters)")
-            return self.merge(left.decode(errors="ignore"), right.decode(errors="ignore"))
+            if is_container(merged):
+                return self.open_container(merged, chaos_params).decode(errors="ignore")
+            parts = self.decrypt_lanes(split_lanes(merged, self.lanes), chaos_params)
+            return self.merge(*(part.decode(errors="ignore") for part in parts))
         except Exception as e:
             handle_exception("Decryption", e)
-            return None
\ No newline at end of file
+            return None
+
+    def encrypt_container(self, plaintext, chaos_override=None, param_id=0):
+        if not isinstance(plaintext, str):
+            handle_exception("Encryption", TypeError("Plaintext must be a string"))
+            return (None,) * (1 + 2 * self.lanes)
+        return self.encrypt_bytes(plaintext.encode(), chaos_override, param_id)
+
+    def encrypt_bytes(self, data, chaos_override=None, param_id=0, out=None):
+        try:
+            # memoryview lanes: the plaintext is never copied before AES
+            parts = lane_slices(memoryview(data).cast('B'), self.lanes)
+            results = self.encrypt_lanes(parts, chaos_override, encrypt_lane_packed)
+            params = tuple(value for result in results for value in result[1:])
+            container = pack_container([result[0] for result in results], param_id, out=out,
+                                       mac_key=self.mac_key, chaos_params=params)
+            return (container, *params)
+        except Exception as e:
+            handle_exception("Encryption", e)
+            return (None,) * (1 + 2 * self.lanes)
+
+    def decrypt_bytes(self, data, *chaos_params, out=None):
+        try:
+            return self.open_container(data, chaos_params, out)
+        except Exception as e:
+            handle_exception("Decryption", e)
+            return None
+
+    def open_envelope(self, data, *chaos_params, out=None):
+        # Like decrypt_bytes, but never prints: a refused container comes back as
+        # DecryptResult.error. Tampering and wrong parameters are caught by the MAC check,
+        # before any lane is unpermuted
+        try:
+            return DecryptResult(self.open_container(data, chaos_params, out))
+        except EnvelopeError as e:
+            return DecryptResult(error=e)
+        except (ValueError, TypeError) as e:
+            return DecryptResult(error=EnvelopeError('malformed', str(e)))
+
+    def open_container(self, data, chaos_params, out=None):
+        try:
+            params = self.lane_params(chaos_params)
+        except (ValueError, TypeError) as e:
+            raise EnvelopeError('invalid_params', str(e)) from None
+        timed('authenticate', authenticate_container, data, self.mac_key, chaos_params, nbytes=len(data))
+        try:
+            _, _, lane_bytes = unpack_container(data)
+        except ValueError as e:
+            raise EnvelopeError('malformed', str(e)) from None
+        if len(lane_bytes) != self.lanes:
+            raise EnvelopeError('malformed', f"Container has {len(lane_bytes)} lanes, system has {self.lanes}")
+        ct_parts = self.run_lanes(unpermute_lane_packed, [(part, r, x0) for part, (r, x0) in zip(lane_bytes, params)])
+        # Every lane decrypts straight into out, each one overwriting the padding of the previous
+        size = sum(max(len(ct) - aes.overhead, 0) for aes, ct in zip(self.aes_lanes, ct_parts))
+        if out is None:
+            out = bytearray(size)
+        elif len(out) < size:
+            out.extend(bytes(size - len(out)))
+        offset = 0
+        try:
+            with memoryview(out) as view:
+                for aes, ct in zip(self.aes_lanes, ct_parts):
+                    length = timed('aes_decrypt', aes.decrypt_into, ct, view[offset:], nbytes=len(ct))
+                    if length is None:
+                        raise EnvelopeError('decrypt_failed', "AES decryption failed (wrong key or parameters)")
+                    offset += length
+        except Exception:
+            # Earlier lanes already decrypted into out: wipe them rather than hand back a
+            # caller's buffer holding plaintext that never verified
+            out[:] = bytes(len(out))
+            del out[:]
+            raise
+        del out[offset:]
+        return out
+
+    def encrypt_stream(self, source, chaos_params, chunk_size=STREAM_CHUNK_SIZE):
+        # Every chunk becomes one self-delimiting frame with its own AES + DNA + chaos stage per lane
+        self.lane_params(chaos_params)
+        header = frame_header(self.lanes)
+        number = offset = 0
+        for chunk in iter_chunks(source, chunk_size):
+            prefix = STREAM_FRAME.pack(FRAME_DATA, number, offset)
+            yield self.encrypt_frame(header, [prefix + part for part in lane_slices(chunk, self.lanes)], chaos_params)
+            number += 1
+            offset += len(chunk)
+        # A stream cut at a frame boundary would otherwise still decrypt
+        prefix = STREAM_FRAME.pack(FRAME_END, number, offset)
+        yield self.encrypt_frame(header, [prefix] * self.lanes, chaos_params)
+
+    def encrypt_frame(self, header, parts, chaos_params):
+        permuted = [result[0] for result in self.encrypt_lanes(parts, chaos_params)]
+        return header.pack(*(len(part) for part in permuted)) + ''.join(permuted).encode('ascii')
+
+    def decrypt_stream(self, source, *chaos_params):
+        self.lane_params(chaos_params)
+        number = offset = 0
+        ended = False
+        for permuted_parts in iter_frames(source, self.lanes):
+            if ended:
+                raise ValueError("Data after the final stream frame")
+            parts = self.decrypt_lanes(permuted_parts, chaos_params)
+            if check_frame(parts, number, offset) == FRAME_END:
+                ended = True
+                continue
+            chunk = b''.join(part[STREAM_FRAME.size:] for part in parts)
+            number += 1
+            offset += len(chunk)
+            yield chunk
+        if not ended:
+            raise ValueError(f"Stream truncated after frame {number} ({offset} bytes): final frame missing")
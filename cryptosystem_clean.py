@@ -1,10 +1,38 @@
+import io
+import os
+import asyncio
+import threading
+import sys
 import time
-import math
+import struct
+import subprocess
+import tracemalloc
 import string
 import random
+import pickle
 import pytest
-from modules import AES_CBC, DNAEncoder
-from cryptosystem import HybridCryptosystem
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import unpad
+from concurrent.futures import ThreadPoolExecutor
+from array import array
+import modules
+from modules import AES_CBC, AES_GCM, DNAEncoder, PermutationCache, ChaosMapper, index_nbytes
+from cryptosystem import HybridCryptosystem, generate_chaos_params, split_lanes
+from benchmark import measure, summarize, run_suite
+from randomness import analyze, shannon_entropy
+from bruteforce import make_target, candidate_grid, run_search
+import cli
+import seekable
+from loadgen import LatencyHistogram, run_load
+from memprofile import run_profile, MemoryProfiler
+from corpus import run_corpus, read_records, summarize_records
+from diffusion import pair_metrics, run_diffusion
+from profiling import StageProfiler, observe
+from container import pack_container, unpack_container, CONTAINER_HEADER, LANE_LENGTH
+import batch
+from batch import encrypt_many, decrypt_many
+from service import (EncryptionService, AsyncClient, ServiceError, FRAME_LENGTH, MESSAGE_HEADER, OP_ENCRYPT,
+                     STATUS_OK, STATUS_ERROR, pack_params, write_frame, read_frame)
 
 
 def generate_random_plaintext(length, charset_choice=3):
@@ -17,32 +45,12 @@ def generate_random_plaintext(length, charset_choice=3):
     return ''.join(random.choice(charset) for _ in range(length))
 
 
-def shannon_entropy(data):
-    freq = {}
-    for b in data:
-        freq[b] = freq.get(b, 0) + 1
-    entropy = 0.0
-    n = len(data)
-    for count in freq.values():
-        p = count / n
-        entropy -= p * math.log2(p)
-    return entropy
-
-
 def benchmark_aes_only(plaintext, iters=100):
     aes = AES_CBC()
     pt_bytes = plaintext.encode()
-    start = time.time()
-    ct = None
-    for _ in range(iters):
-        ct = aes.encrypt(pt_bytes)
-    end = time.time()
-    enc_time = (end - start)/iters
-    start = time.time()
-    for _ in range(iters):
-        pt_out = aes.decrypt(ct)
-    end = time.time()
-    dec_time = (end - start)/iters
+    ct = aes.encrypt(pt_bytes)
+    enc_time = summarize(measure(lambda: aes.encrypt(pt_bytes), repeats=iters))['mean_ns'] / 1e9
+    dec_time = summarize(measure(lambda: aes.decrypt(ct), repeats=iters))['mean_ns'] / 1e9
     pt_entropy_per_byte = shannon_entropy(pt_bytes)
     ct_entropy_per_byte = shannon_entropy(ct)
     pt_len = len(pt_bytes)
@@ -55,18 +63,9 @@ def benchmark_aes_only(plaintext, iters=100):
 
 def benchmark_hybrid(plaintext, iters=100):
     hybrid = HybridCryptosystem()
-    start = time.time()
-    encrypted = None
-    r_l, x0_l, r_r, x0_r = None, None, None, None
-    for _ in range(iters):
-        encrypted, _, _, r_l, x0_l, r_r, x0_r = hybrid.encrypt(plaintext)
-    end = time.time()
-    enc_time = (end - start)/iters
-    start = time.time()
-    for _ in range(iters):
-        pt_out = hybrid.decrypt(encrypted, r_l, x0_l, r_r, x0_r)
-    end = time.time()
-    dec_time = (end - start)/iters
+    encrypted, _, _, r_l, x0_l, r_r, x0_r = hybrid.encrypt(plaintext)
+    enc_time = summarize(measure(lambda: hybrid.encrypt(plaintext), repeats=iters))['mean_ns'] / 1e9
+    dec_time = summarize(measure(lambda: hybrid.decrypt(encrypted, r_l, x0_l, r_r, x0_r), repeats=iters))['mean_ns'] / 1e9
     split_index = len(encrypted)//2
     ct_left = DNAEncoder.decode(encrypted[:split_index])
     ct_right = DNAEncoder.decode(encrypted[split_index:])
@@ -111,6 +110,637 @@ def test_compare_throughput_entropy(length):
         print(f"WARNING: Throughput measured zero for length={length}; consider increasing iterations.")
 
 
+
+def test_stream_round_trip():
+    plaintext = generate_random_plaintext(10000, 3)
+    hybrid = HybridCryptosystem()
+    chaos = generate_chaos_params()
+    merged, *_ = hybrid.encrypt(plaintext, chaos)
+    whole = hybrid.decrypt(merged, *chaos)
+    frames = list(hybrid.encrypt_stream(io.BytesIO(plaintext.encode()), chaos, chunk_size=1001))
+    stream = b''.join(frames)
+    # Re-slice the framed stream at arbitrary boundaries
+    pieces = (stream[i:i + 777] for i in range(0, len(stream), 777))
+    streamed = b''.join(hybrid.decrypt_stream(pieces, *chaos))
+    assert len(frames) == 11
+    assert streamed.decode() == whole == plaintext
+
+
+@pytest.mark.parametrize("tamper", ["drop_end", "drop_last_data", "swap", "repeat", "append"])
+def test_stream_detects_truncation_and_reordering(tamper):
+    hybrid = HybridCryptosystem()
+    chaos = generate_chaos_params()
+    frames = list(hybrid.encrypt_stream(io.BytesIO(os.urandom(4000)), chaos, chunk_size=1000))
+    if tamper == "drop_end":
+        del frames[-1]
+    elif tamper == "drop_last_data":
+        del frames[-2]
+    elif tamper == "swap":
+        frames[1], frames[2] = frames[2], frames[1]
+    elif tamper == "repeat":
+        frames.insert(1, frames[0])
+    else:
+        frames.append(frames[0])
+    with pytest.raises(ValueError):
+        list(hybrid.decrypt_stream(frames, *chaos))
+
+
+def test_benchmark_stages_include_chaos_cost_by_default():
+    report = run_suite([1024], [2], warmup=1, repeats=2, cases=['hybrid_encrypt_bytes'], stages=True,
+                       cache_list=[False, True])
+    cold, cached = ({row['stage'] for row in result['stages']} for result in report['results'])
+    assert {'orbit', 'sort'} <= cold
+    assert not {'orbit', 'sort'} & cached
+
+
+def test_only_encryption_defaults_to_random_params():
+    hybrid = HybridCryptosystem()
+    merged = hybrid.encrypt("attack at dawn")[0]
+    container = hybrid.encrypt_bytes(b"attack at dawn")[0]
+    assert hybrid.decrypt(merged) is None
+    assert hybrid.decrypt_bytes(container) is None
+    assert hybrid.open_envelope(container).code == 'invalid_params'
+    with pytest.raises(ValueError):
+        next(hybrid.encrypt_stream(io.BytesIO(b"attack at dawn"), None))
+    with pytest.raises(ValueError):
+        next(hybrid.decrypt_stream(io.BytesIO(b"")))
+
+
+def peak_allocated(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_streaming_randomness_matches_single_pass():
+    hybrid = HybridCryptosystem()
+    container = hybrid.encrypt_bytes(generate_random_plaintext(50000, 3).encode())[0]
+    whole = analyze(container)
+    # Odd chunk sizes split Monte Carlo points and serial correlation pairs across chunks
+    chunked = analyze(io.BytesIO(container), chunk_size=4099)
+    assert chunked == pytest.approx(whole)
+    assert analyze(container, chunk_size=4099) == pytest.approx(whole)
+    assert whole['entropy'] == pytest.approx(shannon_entropy(container))
+    assert whole['entropy'] > 7.99
+    assert abs(whole['serial_correlation']) < 0.05
+
+
+def test_in_memory_randomness_is_chunked():
+    data = os.urandom(16 * 1024 * 1024)
+    # One float64 copy of the whole input would be 128 MB
+    assert peak_allocated(lambda: analyze(data)) < 32 * 1024 * 1024
+
+
+def test_bruteforce_recovers_planted_params():
+    key, permuted, expected, true_params = make_target(64)
+    candidates = list(candidate_grid(10, 10)) + [true_params]
+    with ThreadPoolExecutor(2) as executor:
+        report = run_search(key, permuted, candidates, expected, executor=executor, max_workers=2, chunk_size=17)
+    assert report['attempts'] == 101
+    assert true_params in report['hits']
+    # The final-block padding check discards nearly every wrong candidate
+    assert report['padding_survivors'] < 10
+
+
+def test_cli_round_trip(tmp_path):
+    key, plain, sealed, opened = (tmp_path / name for name in ('key', 'plain', 'sealed', 'opened'))
+    plain.write_bytes(os.urandom(40000))
+    assert cli.main(['keygen', str(key)]) == 0
+    assert cli.main(['keygen', str(key)]) == 1
+    assert cli.main(['encrypt', '-k', str(key), '-i', str(plain), '-o', str(sealed), '--lanes', '3']) == 0
+    assert cli.main(['decrypt', '-k', str(key), '-i', str(sealed), '-o', str(opened)]) == 0
+    assert opened.read_bytes() == plain.read_bytes()
+
+
+def test_seekable_ranged_reads_and_tampering():
+    key = os.urandom(32)
+    data = os.urandom(10 * 1000 + 123)
+    sealed = io.BytesIO()
+    assert seekable.encrypt_file(io.BytesIO(data), sealed, key, segment_size=1000, lanes=3) == 11
+    sealed = sealed.getvalue()
+    reader = seekable.SeekableReader(sealed, key)
+    assert len(reader) == len(data)
+    for offset, size in ((0, 0), (0, 1), (999, 2), (1000, 1000), (1500, 3000), (10000, 123),
+                         (10122, 1), (10122, 50), (len(data), 10), (len(data) + 5, 1), (0, len(data) + 1)):
+        assert reader.read(offset, size) == data[offset:offset + size]
+    with pytest.raises(IndexError):
+        reader.read_segment(11)
+
+    trailer = len(sealed) - seekable.FILE_TRAILER.size
+    header_field = struct.calcsize('>4sBBH')
+    size_field = trailer + 8
+    for position in (header_field, size_field, size_field + 7, trailer - 1, len(sealed) - 5):
+        # Shrinking or growing the size, changing segment_size, an index entry or the MAC
+        tampered = bytearray(sealed)
+        tampered[position] ^= 0x01
+        with pytest.raises(ValueError):
+            seekable.SeekableReader(bytes(tampered), key)
+    with pytest.raises(ValueError):
+        seekable.SeekableReader(sealed, os.urandom(32))
+    # Swap two equally long segments: the index still checks out but each segment is bound to its number
+    entries = (reader.index_offset + i * seekable.INDEX_ENTRY.size for i in (1, 2))
+    (a, a_len), (b, b_len) = (seekable.INDEX_ENTRY.unpack_from(sealed, entry) for entry in entries)
+    assert a_len == b_len
+    swapped = sealed[:a] + sealed[b:b + b_len] + sealed[a:a + a_len] + sealed[b + b_len:]
+    with pytest.raises(ValueError):
+        seekable.SeekableReader(swapped, key).read(1000, 1)
+
+
+def test_cli_trivial_commands_skip_heavy_imports(tmp_path):
+    root = os.path.dirname(os.path.abspath(cli.__file__))
+    code = (f"import sys; sys.path.insert(0, {root!r}); import cli; cli.main(['keygen', {str(tmp_path / 'probe')!r}]); "
+            "print([m for m in ('numpy', 'Crypto', 'cryptosystem') if m in sys.modules])")
+    probe = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert probe.stdout.strip() == '[]'
+
+
+# Wall-clock budgets depend on the machine, so they only run on request
+benchmark = pytest.mark.skipif(not os.environ.get('RUN_BENCHMARKS'), reason="set RUN_BENCHMARKS=1 to run timing budgets")
+
+
+@benchmark
+def test_cli_cold_start_within_budget(tmp_path):
+    root = os.path.dirname(os.path.abspath(cli.__file__))
+    best = float('inf')
+    for attempt in range(3):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(root, 'cli.py'), 'keygen', str(tmp_path / f'key{attempt}')], check=True)
+        best = min(best, time.perf_counter() - start)
+    assert best * 1000 < cli.CLI_START_BUDGET_MS
+
+
+def test_encrypt_result_indices_are_lazy():
+    plaintext = generate_random_plaintext(20000, 3)
+    hybrid = HybridCryptosystem()
+    result = hybrid.encrypt(plaintext)
+    assert all(indices.values is None for indices in result.indices)
+    # The legacy 7-tuple shape still unpacks and decrypts
+    merged, left, right, r_l, x0_l, r_r, x0_r = result
+    assert merged == result[0] == result.ciphertext
+    assert hybrid.decrypt(merged, r_l, x0_l, r_r, x0_r) == plaintext
+    length = len(merged) // 2
+    expected = ChaosMapper(r_l, x0_l, length).get_indices()
+    assert len(left) == length and left.values is None
+    assert list(left) == list(expected)
+    assert left.nbytes <= 4 * length + 128
+
+
+def test_latency_histogram_percentiles():
+    samples = [random.randint(1, 10 ** 8) for _ in range(20000)]
+    histogram = LatencyHistogram()
+    for sample in samples[:10000]:
+        histogram.record(sample)
+    other = LatencyHistogram()
+    for sample in samples[10000:]:
+        other.record(sample)
+    histogram.merge(other)
+    ordered = sorted(samples)
+    assert histogram.total == len(samples) and histogram.max == ordered[-1]
+    for p in (50, 90, 99, 99.9):
+        exact = ordered[int(-(-len(ordered) * p // 100)) - 1]
+        assert exact <= histogram.value_at_percentile(p) <= exact * (1 + 1 / 64)
+
+
+def test_load_report_at_target_rate():
+    report = run_load(HybridCryptosystem(), ((64, 1), (1024, 1)), duration=0.5, concurrency=2, rate=100)
+    assert report['failures'] == 0
+    assert report['operations'] == 50
+    assert sum(slot['ops'] for slot in report['timeline']) == 50
+    assert report['latency']['p50_ms'] <= report['latency']['p99_ms'] <= report['latency']['max_ms']
+
+
+def test_memory_scaling_within_ceiling():
+    report = run_profile([16 * 1024, 32 * 1024, 64 * 1024], api='bytes')
+    assert not report['regression']
+    stages = {row['stage'] for row in report['runs'][-1]['encrypt']['stages']}
+    assert {'orbit', 'sort', 'aes_encrypt', 'permute'} <= stages
+    # A ceiling below the orbit's 8 bytes per nucleotide must trip
+    assert run_profile([16 * 1024, 32 * 1024], api='bytes', ceiling=4.0)['regression']
+
+
+def test_failing_stage_keeps_memory_profiler_balanced():
+    hybrid = HybridCryptosystem(mac_key=os.urandom(32))
+    container, *params = hybrid.encrypt_bytes(os.urandom(1024))
+    tampered = container[:-1] + bytes([container[-1] ^ 1])
+    profiler = MemoryProfiler()
+    tracemalloc.start()
+    try:
+        result, _, _ = profiler.measure(lambda: hybrid.open_envelope(tampered, *params))
+    finally:
+        tracemalloc.stop()
+    assert result.code == 'bad_mac'
+    assert profiler.stack == []
+    assert [row['stage'] for row in profiler.report()] == ['authenticate']
+
+
+@pytest.mark.parametrize("name", ["results.jsonl", "results.csv"])
+def test_corpus_runner_resumes(tmp_path, name):
+    root = tmp_path / "corpus"
+    (root / "nested").mkdir(parents=True)
+    for i in range(6):
+        (root / ("nested" if i % 2 else "") / f"file{i}.bin").write_bytes(os.urandom(500 * i))
+    output = str(tmp_path / name)
+    with ThreadPoolExecutor(2) as executor:
+        assert run_corpus(str(root), output, executor=executor, max_workers=2, chunk_size=2)['written'] == 6
+        # Simulate a crash midway through writing the last record
+        with open(output, 'rb+') as f:
+            f.truncate(os.path.getsize(output) - 5)
+        (root / "late.bin").write_bytes(os.urandom(700))
+        progress = run_corpus(str(root), output, executor=executor, max_workers=2, chunk_size=2)
+    assert progress == {'resumed': 5, 'written': 2}
+    records = read_records(output)
+    assert sorted(record['path'] for record in records) == sorted(
+        ['file0.bin', 'file2.bin', 'file4.bin', 'late.bin'] + [os.path.join('nested', f'file{i}.bin') for i in (1, 3, 5)])
+    summary = summarize_records(records)
+    assert summary['analyzed'] == 7 and summary['plaintext_bytes'] == 500 * 15 + 700
+    empty = next(record for record in records if record['path'] == 'file0.bin')
+    assert empty['pt_serial_correlation'] is None and empty['pt_monte_carlo_pi'] is None
+    with open(output) as f:
+        assert 'NaN' not in f.read()
+    assert summary['ct_entropy']['size_weighted'] > 7.5
+
+
+def test_pair_metrics_extremes():
+    data = os.urandom(64)
+    inverted = bytes(b ^ 0xFF for b in data)
+    metrics = pair_metrics([data, data], [data, inverted])
+    assert metrics['npcr'] == pytest.approx([0.0, 100.0])
+    assert metrics['bit_flip'] == pytest.approx([0.0, 100.0])
+    assert metrics['uaci'][0] == 0.0 and 0.0 < metrics['uaci'][1] <= 100.0
+
+
+def test_seeded_diffusion_is_reproducible():
+    with ThreadPoolExecutor(2) as executor:
+        runs = [run_diffusion(trials=40, size=64, seed=11, executor=executor, chunk_size=8) for _ in range(2)]
+    assert runs[0] == runs[1]
+    plaintext = runs[0]['experiments']['plaintext']
+    assert 0.0 < plaintext['npcr']['mean'] < 100.0
+    assert runs[0]['experiments']['r']['npcr']['max'] <= 50.0 + 1e-9
+
+
+def test_envelope_rejects_before_unpermute():
+    mac_key = os.urandom(32)
+    hybrid = HybridCryptosystem(mac_key=mac_key)
+    data = os.urandom(4096)
+    container, *params = hybrid.encrypt_bytes(data, param_id=7)
+    with observe(StageProfiler()) as profiler:
+        assert hybrid.open_envelope(container, *params).plaintext == data
+    assert {'authenticate', 'unpermute'} <= {row['stage'] for row in profiler.report()}
+
+    tampered = bytearray(container)
+    tampered[8] ^= 1  # parameter set ID
+    wrong_params = list(params)
+    wrong_params[1] += 1e-12
+    for candidate, chaos in ((bytes(tampered), params), (container, wrong_params)):
+        with observe(StageProfiler()) as profiler:
+            result = hybrid.open_envelope(candidate, *chaos)
+        assert result.code == 'bad_mac'
+        # Refused by the MAC check: nothing was unpermuted or decoded
+        assert {row['stage'] for row in profiler.report()} <= {'authenticate'}
+
+    assert HybridCryptosystem().open_envelope(container, *params).code == 'missing_key'
+    plain_container, *plain_params = HybridCryptosystem().encrypt_bytes(data)
+    assert hybrid.open_envelope(plain_container, *plain_params).code == 'unauthenticated'
+    assert HybridCryptosystem().open_envelope(plain_container, *generate_chaos_params()).code == 'decrypt_failed'
+    assert hybrid.open_envelope(b'4PC', *params).code == 'malformed'
+
+
+def test_container_round_trip_and_malformed_input():
+    lanes = [b'first lane', b'', b'x' * 300]
+    container = pack_container(lanes, param_id=42)
+    param_id, flags, lane_bytes = unpack_container(container)
+    assert (param_id, flags, [bytes(lane) for lane in lane_bytes]) == (42, 0, lanes)
+    out = bytearray(b'stale bytes from a longer previous container' * 20)
+    assert pack_container(lanes, param_id=42, out=out) == container
+
+    table_end = CONTAINER_HEADER.size + LANE_LENGTH.size * len(lanes)
+    bad_version = bytearray(container)
+    bad_version[4] = 99
+    longer_table = bytearray(container)
+    longer_table[CONTAINER_HEADER.size + 3] += 1  # first lane length one more than the body holds
+    for bad in (container[:CONTAINER_HEADER.size - 1],  # header cut short
+                container[:table_end - 2],  # lane table cut short
+                container[:-1],  # body cut short
+                container + b'\0',  # trailing bytes
+                bytes(longer_table),
+                bytes(bad_version),
+                b'XXXX' + container[4:]):
+        with pytest.raises(ValueError):
+            unpack_container(bad)
+
+
+def legacy_indices(r, x0, length):
+    # ChaosMapper.get_indices as it was before NumPy: list of floats, stable sorted() order
+    x = x0
+    sequence = []
+    for _ in range(length):
+        x = r * x * (1 - x)
+        sequence.append(x)
+    return sequence, sorted(range(length), key=lambda i: sequence[i])
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_chaos_mapper_matches_legacy_reference(monkeypatch, use_numpy):
+    if not use_numpy:
+        monkeypatch.setattr(modules, 'np', None)
+    elif modules.np is None:
+        pytest.skip("NumPy not installed")
+    # r=4, x0=0.5 collapses to 1.0 then 0.0 forever and x0=0.75 is a fixed point, so most
+    # values tie and only a stable sort keeps the legacy order
+    for r, x0, length in ((3.9, 0.123456789, 5000), (4.0, 0.5, 257), (4.0, 0.75, 100), (3.57, 0.999, 1031)):
+        sequence, reference = legacy_indices(r, x0, length)
+        mapper = ChaosMapper(r, x0, length)
+        assert list(mapper.orbit()) == sequence
+        assert list(mapper.get_indices()) == reference
+        cached = ChaosMapper(r, x0, length, cache=PermutationCache())
+        assert list(cached.get_indices()) == reference
+        dna = DNAEncoder.encode(os.urandom(length // 4 + 1))[:length]
+        permuted = ChaosMapper.permute(dna, mapper.get_indices())
+        assert permuted == ''.join(dna[i] for i in reference)
+        assert ChaosMapper.unpermute(permuted, mapper.get_indices()) == dna
+        assert cached.restore(permuted) == dna
+
+
+def test_permutation_cache_lru_budget_and_counters():
+    forward, inverse = array('I', range(1000)), array('I', range(1000))
+    entry = index_nbytes(forward) + index_nbytes(inverse)
+    cache = PermutationCache(max_bytes=2 * entry)
+    cache.put('a', forward, inverse)
+    cache.put('b', forward, inverse)
+    cache.put('a', forward, inverse)  # replacing an entry does not count it twice
+    assert cache.get('a') == (forward, inverse)
+    cache.put('c', forward, inverse)  # evicts b, the least recently used
+    assert cache.get('b') is None
+    assert cache.get('c') is not None
+    cache.put('huge', array('I', range(10000)), inverse)  # larger than the whole budget: not cached
+    assert cache.get('huge') is None
+    assert cache.stats() == {'hits': 2, 'misses': 2, 'evictions': 1, 'entries': 2,
+                             'bytes': 2 * entry, 'max_bytes': 2 * entry}
+
+    hybrid = HybridCryptosystem(perm_cache=PermutationCache())
+    chaos = generate_chaos_params()
+    for _ in range(2):
+        hybrid.encrypt_bytes(os.urandom(100), chaos)
+    assert hybrid.perm_cache.stats()['hits'] == hybrid.lanes
+
+
+def test_dna_decode_is_strict():
+    data = bytes(range(256))
+    assert DNAEncoder.decode(DNAEncoder.encode(data)) == data
+    for bad in ("A_TC", " ATC", "AT1C", "ATCGA", "atcg"):
+        with pytest.raises(ValueError):
+            DNAEncoder.decode(bad)
+
+
+def test_cbc_decrypt_reuses_ecb_and_matches_reference():
+    aes = pickle.loads(pickle.dumps(AES_CBC()))
+    for size in (0, 15, 16, 1000):
+        data = os.urandom(size)
+        ct = bytes(aes.encrypt(data))
+        reference = unpad(AES.new(aes.key, AES.MODE_CBC, ct[:16]).decrypt(ct[16:]), AES.block_size)
+        assert aes.decrypt(ct) == reference == data
+    assert aes.decrypt(aes.encrypt(b'x' * 32)[:-1]) is None
+
+
+def test_failed_gcm_open_leaves_no_plaintext_in_out():
+    aes = AES_GCM()
+    ct = aes.encrypt(b'secret' * 10)
+    ct[-1] ^= 1
+    output = bytearray(60)
+    assert aes.decrypt_into(ct, memoryview(output)) is None
+    assert output == bytes(60)
+
+    hybrid = HybridCryptosystem(cipher='gcm')
+    container, *params = hybrid.encrypt_bytes(b'secret' * 1000, generate_chaos_params())
+    tampered = bytearray(container)
+    tampered[-1] ^= 1  # last lane only; the first lane still decrypts into out before it fails
+    out = bytearray(b'previous contents')
+    assert hybrid.open_envelope(bytes(tampered), *params, out=out).code == 'decrypt_failed'
+    assert out == bytearray()
+
+
+@pytest.mark.parametrize("lanes", [2, 3])
+def test_str_round_trip_with_unequal_lanes(lanes):
+    # Around every multiple of 16 * lanes some lanes pad one AES block more than others
+    hybrid = HybridCryptosystem(lanes=lanes)
+    for length in sorted({max(0, 16 * lanes * k + d) for k in range(4) for d in range(-lanes - 1, lanes + 2)}):
+        plaintext = generate_random_plaintext(length, 3)
+        merged, *rest = hybrid.encrypt(plaintext)
+        params = rest[lanes:]
+        if len({len(part) for part in split_lanes(merged, lanes)}) == 1:
+            assert set(merged) <= set('ATCG')
+        assert hybrid.decrypt(merged, *params) == plaintext
+
+
+@pytest.mark.parametrize("cipher", sorted(modules.CIPHER_BACKENDS))
+def test_str_round_trip_for_every_backend(cipher):
+    # CTR and GCM lanes are as long as their plaintext slice, so odd lengths give unequal lanes
+    hybrid = HybridCryptosystem(cipher=cipher)
+    for length in (0, 1, 15, 31, 33, 1001):
+        plaintext = generate_random_plaintext(length, 3)
+        merged, *rest = hybrid.encrypt(plaintext)
+        assert hybrid.decrypt(merged, *rest[2:]) == plaintext
+        container, *params = hybrid.encrypt_container(plaintext)
+        assert hybrid.decrypt(container, *params) == plaintext
+
+
+def test_batch_round_trip_with_unequal_lanes():
+    # 31 characters split 15 / 16, so the two lanes pad to one and two AES blocks
+    messages = ['x' * 31, 'y' * 47, 'z']
+    hybrid = HybridCryptosystem()
+    with ThreadPoolExecutor(2) as executor:
+        encrypted = list(encrypt_many(hybrid, messages, executor=executor, chunk_size=2))
+        assert list(decrypt_many(hybrid, encrypted, executor=executor, chunk_size=2)) == messages
+
+
+def test_pool_workers_seal_with_the_mac_key():
+    hybrid = HybridCryptosystem(mac_key=os.urandom(32))
+    messages = ['', 'short', 'x' * 3000]
+    with ThreadPoolExecutor(2) as executor:
+        sealed = list(encrypt_many(hybrid, messages, executor=executor, chunk_size=1))
+        assert [hybrid.open_envelope(container, *params).ok for container, *params in sealed] == [True] * 3
+        assert list(decrypt_many(hybrid, sealed, executor=executor, chunk_size=1)) == messages
+
+
+def test_worker_systems_keep_few_key_sets():
+    systems = [HybridCryptosystem(mac_key=os.urandom(32)) for _ in range(batch.WORKER_SYSTEM_LIMIT + 2)]
+    for hybrid in systems:
+        assert list(decrypt_many(hybrid, encrypt_many(hybrid, ['abc']))) == ['abc']
+    assert len(batch.worker_systems) == batch.WORKER_SYSTEM_LIMIT
+    assert batch.system_keys(systems[0]) not in batch.worker_systems
+    worker = batch.get_worker_system(batch.system_keys(systems[-1]))
+    assert batch.get_worker_system(batch.system_keys(systems[-1])) is worker
+
+
+class GatedExecutor(ThreadPoolExecutor):
+    # Holds every batch until the gate opens, so requests pile up behind the service queues
+    def __init__(self):
+        super().__init__(1)
+        self.gate = threading.Event()
+
+    def submit(self, fn, *args):
+        return super().submit(self.run_gated, fn, *args)
+
+    def run_gated(self, fn, *args):
+        self.gate.wait()
+        return fn(*args)
+
+
+async def start_service(executor, **kwargs):
+    service = EncryptionService(HybridCryptosystem(), executor=executor, max_workers=1, **kwargs)
+    server = await service.start('127.0.0.1', 0)
+    return service, server.sockets[0].getsockname()[1]
+
+
+def run_with_service(scenario, executor=None, **kwargs):
+    executor = executor or ThreadPoolExecutor(1)
+
+    async def main():
+        service, port = await start_service(executor, **kwargs)
+        try:
+            return await asyncio.wait_for(scenario(service, port), 30)
+        finally:
+            await service.close()
+
+    try:
+        return asyncio.run(main())
+    finally:
+        executor.shutdown()
+
+
+def test_service_round_trip_including_empty_payload(capsys):
+    async def scenario(service, port):
+        client = await AsyncClient.connect(port=port)
+        try:
+            for message in (b'', os.urandom(1), os.urandom(5000)):
+                container, params = await client.encrypt(message)
+                assert await client.decrypt(container, params) == message
+            container, params = await client.encrypt(b'secret')
+            try:
+                await client.decrypt(container[:-1], params)
+            except ServiceError as e:
+                assert str(e).startswith('malformed: ')
+            else:
+                raise AssertionError("Truncated container was accepted")
+        finally:
+            await client.close()
+
+    run_with_service(scenario)
+    # Refused containers come back as error responses, nothing is printed by the workers
+    assert capsys.readouterr().out == ''
+
+
+def test_service_bad_frames_get_error_responses():
+    async def scenario(service, port):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            # Too short for the message header, then a valid request on the same connection
+            writer.write(FRAME_LENGTH.pack(3) + b'\x01\x00\x00')
+            write_frame(writer, MESSAGE_HEADER.pack(OP_ENCRYPT, 7), pack_params(None) + b'hello')
+            write_frame(writer, MESSAGE_HEADER.pack(99, 8), b'')
+            await writer.drain()
+            replies = {}
+            for _ in range(3):
+                frame = await read_frame(reader)
+                status, request_id = MESSAGE_HEADER.unpack_from(frame)
+                replies[request_id] = status
+            assert replies == {0: STATUS_ERROR, 7: STATUS_OK, 8: STATUS_ERROR}
+        finally:
+            writer.close()
+
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            writer.write(FRAME_LENGTH.pack(service.max_frame_size + 1))
+            await writer.drain()
+            frame = await read_frame(reader)
+            assert MESSAGE_HEADER.unpack_from(frame) == (STATUS_ERROR, 0)
+            assert b'exceeds' in frame
+            assert await read_frame(reader) is None
+        finally:
+            writer.close()
+
+    run_with_service(scenario, max_frame_size=1024)
+
+
+def test_service_full_queue_stops_reading_requests():
+    requests = 50
+    executor = GatedExecutor()
+
+    async def scenario(service, port):
+        parsed = 0
+        parse_request = service.parse_request
+
+        def counting_parse(op, body):
+            nonlocal parsed
+            parsed += 1
+            return parse_request(op, body)
+
+        service.parse_request = counting_parse
+        client = await AsyncClient.connect(port=port)
+        try:
+            tasks = [asyncio.create_task(client.encrypt(bytes([i]))) for i in range(requests)]
+            await asyncio.sleep(0.3)
+            # Two batches in flight, one waiting for a slot, one queued, one blocked on put
+            assert parsed <= 5
+            assert service.queues[OP_ENCRYPT].full()
+            executor.gate.set()
+            results = await asyncio.gather(*tasks)
+            assert parsed == requests
+            for i, (container, params) in enumerate(results):
+                assert await client.decrypt(container, params) == bytes([i])
+        finally:
+            executor.gate.set()
+            await client.close()
+
+    run_with_service(scenario, executor, max_batch=1, queue_size=1)
+
+
+def test_service_micro_batching_groups_requests():
+    batch_sizes = []
+
+    async def scenario(service, port):
+        run_batch = service.run_batch
+
+        async def recording_run_batch(op, batch):
+            batch_sizes.append(len(batch))
+            await run_batch(op, batch)
+
+        service.run_batch = recording_run_batch
+        client = await AsyncClient.connect(port=port)
+        try:
+            await asyncio.gather(*(client.encrypt(b'x' * 16) for _ in range(32)))
+        finally:
+            await client.close()
+
+    run_with_service(scenario, max_batch=8, batch_delay=0.05)
+    assert sum(batch_sizes) == 32
+    assert max(batch_sizes) == 8 and len(batch_sizes) < 32
+
+
+def test_bytes_api_allocates_less():
+    size = 1024 * 1024
+    text = generate_random_plaintext(size, 2)
+    data = text.encode()
+    hybrid = HybridCryptosystem(perm_cache=PermutationCache(256 * 1024 * 1024))
+    chaos = generate_chaos_params()
+    ct_buf, pt_buf = bytearray(), bytearray()
+    # Warm the permutation cache so only the per-call pipeline is measured
+    merged, *_ = hybrid.encrypt(text, chaos)
+    hybrid.encrypt_bytes(data, chaos, out=ct_buf)
+    hybrid.decrypt_bytes(ct_buf, *chaos, out=pt_buf)
+    str_enc = peak_allocated(lambda: hybrid.encrypt(text, chaos))
+    bytes_enc = peak_allocated(lambda: hybrid.encrypt_bytes(data, chaos, out=ct_buf))
+    str_dec = peak_allocated(lambda: hybrid.decrypt(merged, *chaos))
+    bytes_dec = peak_allocated(lambda: hybrid.decrypt_bytes(ct_buf, *chaos, out=pt_buf))
+    print(f"\nPeak bytes per MB: str encrypt={str_enc}, bytes encrypt={bytes_enc}, "
+          f"str decrypt={str_dec}, bytes decrypt={bytes_dec}")
+    assert pt_buf == data
+    assert bytes_enc < str_enc
+    assert bytes_dec < str_dec
+
 if __name__ == "__main__":
     print("AES Comparison: Manual Run with User Input")
     try:
@@ -2,11 +2,14 @@ from modules import AES_CBC, DNAEncoder, ChaosMapper
 from cryptosystem import HybridCryptosystem
 
 def format_indices(indices, label="Indices", per_line=20):
+    # indices is a LazyIndices: the permutation is rebuilt here, on first access
     print(f"{label} (total {len(indices)}):")
-    for i in range(0, len(indices), per_line):
-        line = indices[i:i+per_line]
+    values = indices.materialize()
+    for i in range(0, len(values), per_line):
+        line = values[i:i+per_line]
         print("  ", ", ".join(str(x) for x in line))
     print()
+    indices.release()
 
 def get_float(prompt, default=None):
     while True:
@@ -33,15 +36,17 @@ def demo_encrypt_decrypt():
     # Step 2: Encrypt plaintext with hybrid system (AES + DNA + chaos mapping)
     print("[Step 2] Encrypting Plaintext using Cryptosystem Model")
     hybrid = HybridCryptosystem()
-    encrypted, indices_left, indices_right, r_left, x0_left, r_right, x0_right = hybrid.encrypt(plaintext)
+    result = hybrid.encrypt(plaintext)
+    encrypted = result.ciphertext
+    r_left, x0_left, r_right, x0_right = result.params
     print(f"\nEncrypted (DNA + Permuted) Ciphertext:\n  {encrypted}\n")
     print(f"Chaos Parameters (Secret Keys):")
     print(f"  Left half - r: {r_left}, x0: {x0_left}")
     print(f"  Right half - r: {r_right}, x0: {x0_right}\n")
 
     print("Permutation indices applied to DNA (Chaos Mapping):")
-    format_indices(indices_left, "Left Indices")
-    format_indices(indices_right, "Right Indices")
+    format_indices(result.indices[0], "Left Indices")
+    format_indices(result.indices[1], "Right Indices")
 
     # Step 3: Decrypt the Ciphertext with correct chaos parameters
     print("[Step 3] Decrypting Ciphertext with Correct Chaos Parameters")
@@ -0,0 +1,195 @@
+import sys
+import json
+import random
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from modules import AES_CBC
+from cryptosystem import CHAOS_R_MIN, CHAOS_R_MAX
+from container import unpack_container
+from batch import batched, get_worker_system
+from benchmark import percentile
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_TRIALS = 1000
+DEFAULT_SIZE = 256
+DEFAULT_DELTA = 1e-10
+DIFFUSION_CHUNK_SIZE = 64
+EXPERIMENTS = ('plaintext', 'r', 'x0')
+METRICS = ('npcr', 'uaci', 'bit_flip')
+# Expected values for two independent uniformly random byte strings
+IDEAL = {'npcr': 99.6094, 'uaci': 33.4635, 'bit_flip': 50.0}
+
+class FixedIVCipher(AES_CBC):
+    # Same key and IV for both sides of a pair, so any ciphertext difference comes from
+    # the perturbation and not from a fresh random IV
+    def __init__(self, key, iv):
+        super().__init__(key)
+        self.iv = iv
+
+    def encrypt(self, plaintext, iv=None):
+        return super().encrypt(plaintext, self.iv if iv is None else iv)
+
+class FixedIV(namedtuple('FixedIV', 'iv')):
+    # Cipher factory for batch.get_worker_system. A tuple, so it pickles and compares by IV
+    # and workers find the same cached system for every chunk
+    def __call__(self, key):
+        return FixedIVCipher(key, self.iv)
+
+def fixed_iv_keys(keys, iv):
+    # Worker key set as built by batch.system_keys, without a MAC key
+    return tuple((FixedIV(iv), key) for key in keys), None
+
+def payload(container):
+    # Lane bytes only: the container header and lane table are the same on both sides
+    return b''.join(unpack_container(container)[2])
+
+def pair_metrics(first, second):
+    # Rows are ciphertext pairs of equal length; returns per-pair NPCR, UACI and bit-flip %
+    if np is not None:
+        a = np.frombuffer(b''.join(first), dtype=np.uint8).reshape(len(first), -1)
+        b = np.frombuffer(b''.join(second), dtype=np.uint8).reshape(len(second), -1)
+        npcr = (a != b).mean(axis=1) * 100
+        uaci = np.abs(a.astype(np.int16) - b).mean(axis=1) / 255 * 100
+        bit_flip = np.unpackbits(a ^ b, axis=1).mean(axis=1) * 100
+        return {'npcr': npcr.tolist(), 'uaci': uaci.tolist(), 'bit_flip': bit_flip.tolist()}
+    metrics = {metric: [] for metric in METRICS}
+    for x, y in zip(first, second):
+        metrics['npcr'].append(sum(i != j for i, j in zip(x, y)) / len(x) * 100)
+        metrics['uaci'].append(sum(abs(i - j) for i, j in zip(x, y)) / len(x) / 255 * 100)
+        flipped = (int.from_bytes(x, 'big') ^ int.from_bytes(y, 'big')).bit_count()
+        metrics['bit_flip'].append(flipped / (8 * len(x)) * 100)
+    return metrics
+
+def diffusion_chunk(keys, items):
+    # Runs in a worker process; items are (plaintext, plaintext', chaos, chaos') pairs
+    hybrid = get_worker_system(keys)
+    first, second = [], []
+    wrong_key_opens = 0
+    for plaintext, other_plaintext, chaos, other_chaos in items:
+        container = hybrid.encrypt_bytes(plaintext, chaos)[0]
+        first.append(payload(container))
+        second.append(payload(hybrid.encrypt_bytes(other_plaintext, other_chaos)[0]))
+        if other_chaos != chaos:
+            # Key sensitivity on the way back: the perturbed parameters should not open it
+            try:
+                wrong_key_opens += hybrid.open_container(container, other_chaos) == plaintext
+            except ValueError:
+                pass
+    metrics = pair_metrics(first, second)
+    metrics['wrong_key_opens'] = wrong_key_opens
+    return metrics
+
+def flip_bit(data, rng):
+    flipped = bytearray(data)
+    bit = rng.randrange(8 * len(flipped))
+    flipped[bit // 8] ^= 1 << (bit % 8)
+    return bytes(flipped)
+
+def perturb(chaos, param, delta, rng):
+    # Nudge r or x0 of one random lane by delta, staying inside its valid range
+    chaos = list(chaos)
+    lane = rng.randrange(len(chaos) // 2)
+    index = 2 * lane + (param == 'x0')
+    low, high = (CHAOS_R_MIN, CHAOS_R_MAX) if param == 'r' else (0.0, 1.0)
+    value = chaos[index] + delta
+    chaos[index] = value if low < value < high else chaos[index] - delta
+    return tuple(chaos)
+
+def seeded_chaos(rng, lanes):
+    params = []
+    for _ in range(lanes):
+        params += [rng.uniform(CHAOS_R_MIN, CHAOS_R_MAX), rng.uniform(1e-6, 1 - 1e-6)]
+    return tuple(params)
+
+def generate_pairs(experiment, trials, size, lanes, delta, rng):
+    for _ in range(trials):
+        plaintext = rng.randbytes(size)
+        chaos = seeded_chaos(rng, lanes)
+        if experiment == 'plaintext':
+            yield plaintext, flip_bit(plaintext, rng), chaos, chaos
+        else:
+            yield plaintext, plaintext, chaos, perturb(chaos, experiment, delta, rng)
+
+def distribution(values):
+    ordered = sorted(values)
+    mean = sum(ordered) / len(ordered)
+    return {
+        'mean': mean,
+        'stddev': (sum((v - mean) ** 2 for v in ordered) / len(ordered)) ** 0.5,
+        'min': ordered[0],
+        'p5': percentile(ordered, 0.05),
+        'p50': percentile(ordered, 0.5),
+        'p95': percentile(ordered, 0.95),
+        'max': ordered[-1],
+    }
+
+def run_diffusion(trials=DEFAULT_TRIALS, size=DEFAULT_SIZE, lanes=2, experiments=EXPERIMENTS, delta=DEFAULT_DELTA,
+                  seed=None, executor=None, max_workers=None, chunk_size=DIFFUSION_CHUNK_SIZE):
+    # A seed fixes keys, IV, plaintexts, chaos parameters and perturbations, so runs repeat
+    # exactly; without one the generator is seeded from the OS. Analysis only, not key material
+    rng = random.Random(seed)
+    keys = fixed_iv_keys(tuple(rng.randbytes(32) for _ in range(lanes)), rng.randbytes(16))
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers)
+    report = {'trials': trials, 'size': size, 'lanes': lanes, 'delta': delta, 'seed': seed, 'experiments': {}}
+    try:
+        for experiment in experiments:
+            if experiment not in EXPERIMENTS:
+                raise ValueError(f"Unknown experiment {experiment!r}, expected one of {EXPERIMENTS}")
+            pairs = generate_pairs(experiment, trials, size, lanes, delta, rng)
+            futures = [executor.submit(diffusion_chunk, keys, chunk) for chunk in batched(pairs, chunk_size)]
+            results = [future.result() for future in futures]
+            summary = {metric: distribution([v for result in results for v in result[metric]]) for metric in METRICS}
+            if experiment != 'plaintext':
+                summary['wrong_key_opens'] = sum(result['wrong_key_opens'] for result in results)
+            report['experiments'][experiment] = summary
+    finally:
+        if own_executor:
+            executor.shutdown()
+    return report
+
+def print_report(report):
+    print(f"Diffusion analysis: {report['trials']:,} pairs per experiment, {report['size']}-byte messages, "
+          f"{report['lanes']} lanes, seed {report['seed']}\n")
+    print("| Experiment | Metric   | Mean     | Stddev  | p5       | p50      | p95      | Ideal    |")
+    print("|------------|----------|----------|---------|----------|----------|----------|----------|")
+    for experiment, summary in report['experiments'].items():
+        for metric in METRICS:
+            d = summary[metric]
+            print(f"| {experiment:<10} | {metric:<8} | {d['mean']:>7.3f}% | {d['stddev']:>7.3f} | {d['p5']:>7.3f}% "
+                  f"| {d['p50']:>7.3f}% | {d['p95']:>7.3f}% | {IDEAL[metric]:>7.3f}% |")
+    print()
+    for experiment, summary in report['experiments'].items():
+        if 'wrong_key_opens' in summary:
+            print(f"{experiment} perturbed by {report['delta']:g}: {summary['wrong_key_opens']} of "
+                  f"{report['trials']:,} ciphertexts opened with the wrong parameters")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="NPCR/UACI/bit-flip diffusion and key-sensitivity analysis")
+    parser.add_argument('--trials', type=int, default=DEFAULT_TRIALS)
+    parser.add_argument('--size', type=int, default=DEFAULT_SIZE)
+    parser.add_argument('--lanes', type=int, default=2)
+    parser.add_argument('--experiments', nargs='+', choices=EXPERIMENTS, default=list(EXPERIMENTS))
+    parser.add_argument('--delta', type=float, default=DEFAULT_DELTA, help="chaos parameter perturbation")
+    parser.add_argument('--seed', type=int, default=None, help="reproducible run")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=DIFFUSION_CHUNK_SIZE)
+    parser.add_argument('--output', help="write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    report = run_diffusion(args.trials, args.size, args.lanes, args.experiments, args.delta, args.seed,
+                           max_workers=args.workers, chunk_size=args.chunk_size)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from cryptosystem import HybridCryptosystem
+from batch import get_worker_system, system_keys
+
+DEFAULT_MIX = ((64, 5), (1024, 3), (16 * 1024, 2))
+DEFAULT_DURATION = 10.0
+DEFAULT_CONCURRENCY = 4
+TIMELINE_INTERVAL = 1.0
+# Workers start together at a wall-clock instant, after the pool has spun up
+START_DELAY = 0.2
+REPORT_PERCENTILES = (50, 90, 99, 99.9)
+OPERATIONS = ('roundtrip', 'encrypt', 'decrypt')
+# 2 ** 7 sub-buckets per power of two: every recorded value is within 1/64 of its bucket bounds
+SUB_BUCKET_BITS = 7
+
+class LatencyHistogram:
+    # Log-linear buckets in the style of HdrHistogram: exact below 2 ** SUB_BUCKET_BITS ns,
+    # then a fixed number of linear sub-buckets per power of two. Recording is O(1) and
+    # memory grows with the dynamic range, not with the number of samples.
+    def __init__(self, sub_bucket_bits=SUB_BUCKET_BITS):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.counts = {}
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def bucket(self, value):
+        shift = max(value.bit_length() - self.sub_bucket_bits, 0)
+        return (shift << self.sub_bucket_bits) | (value >> shift)
+
+    def bucket_bounds(self, bucket):
+        shift = bucket >> self.sub_bucket_bits
+        mantissa = bucket & ((1 << self.sub_bucket_bits) - 1)
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def record(self, value_ns, count=1):
+        value_ns = max(int(value_ns), 0)
+        bucket = self.bucket(value_ns)
+        self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.total += count
+        self.sum += value_ns * count
+        self.min = value_ns if self.min is None else min(self.min, value_ns)
+        self.max = value_ns if self.max is None else max(self.max, value_ns)
+
+    def merge(self, other):
+        if other.sub_bucket_bits != self.sub_bucket_bits:
+            raise ValueError("Cannot merge histograms with different precision")
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.total += other.total
+        self.sum += other.sum
+        if other.total:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def value_at_percentile(self, percentile):
+        # Highest value equivalent to the bucket holding the requested rank, capped at the observed max
+        if not self.total:
+            return 0
+        rank = max(1, -(-self.total * percentile // 100))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self.bucket_bounds(bucket)[1], self.max)
+        return self.max
+
+    def buckets(self):
+        for bucket in sorted(self.counts):
+            yield self.bucket_bounds(bucket)[0], self.counts[bucket]
+
+    def summary(self, percentiles=REPORT_PERCENTILES):
+        stats = {
+            'count': self.total,
+            'min_ms': (self.min or 0) / 1e6,
+            'mean_ms': self.sum / self.total / 1e6 if self.total else 0.0,
+            'max_ms': (self.max or 0) / 1e6,
+        }
+        for p in percentiles:
+            stats[f'p{p:g}_ms'] = self.value_at_percentile(p) / 1e6
+        return stats
+
+def parse_mix(text):
+    # "64:5,1024:3,16384:2" -> message sizes with relative weights
+    mix = []
+    for part in text.split(','):
+        size, _, weight = part.partition(':')
+        mix.append((int(size), float(weight or 1)))
+    if not mix or any(size <= 0 or weight <= 0 for size, weight in mix):
+        raise ValueError(f"Invalid message mix {text!r}")
+    return tuple(mix)
+
+def prepare_payloads(hybrid, mix, op):
+    payloads = {}
+    for size, _ in mix:
+        data = os.urandom(size)
+        if op == 'decrypt':
+            container, *params = hybrid.encrypt_bytes(data)
+            payloads[size] = (data, container, params)
+        else:
+            payloads[size] = (data, None, None)
+    return payloads
+
+def run_operation(hybrid, op, payload):
+    data, container, params = payload
+    if op == 'decrypt':
+        return hybrid.decrypt_bytes(container, *params) == data
+    container, *params = hybrid.encrypt_bytes(data)
+    if container is None:
+        return False
+    return op == 'encrypt' or hybrid.decrypt_bytes(container, *params) == data
+
+def run_worker(keys, mix, op, duration, rate, start_at, seed):
+    # Runs on a thread or in a pool process. With a target rate the loop is open: every
+    # operation has an intended start time and latency is measured from it, so a stall
+    # shows up in the tail instead of silently lowering the offered load.
+    hybrid = get_worker_system(keys)
+    rng = random.Random(seed)
+    sizes = [size for size, _ in mix]
+    weights = [weight for _, weight in mix]
+    payloads = prepare_payloads(hybrid, mix, op)
+    histogram = LatencyHistogram()
+    timeline = {}
+    interval_ns = int(1e9 / rate) if rate else 0
+    time.sleep(max(start_at - time.time(), 0))
+    begin = time.perf_counter_ns()
+    end = begin + int(duration * 1e9)
+    intended = begin
+    while True:
+        now = time.perf_counter_ns()
+        if rate:
+            if intended >= end:
+                break
+            if intended > now:
+                time.sleep((intended - now) / 1e9)
+            start = intended
+            intended += interval_ns
+        else:
+            if now >= end:
+                break
+            start = now
+        size = rng.choices(sizes, weights)[0]
+        try:
+            ok = run_operation(hybrid, op, payloads[size])
+        except Exception:
+            ok = False
+        done = time.perf_counter_ns()
+        histogram.record(done - start)
+        slot = timeline.setdefault(int((done - begin) / 1e9 / TIMELINE_INTERVAL), [0, 0, 0])
+        slot[0] += 1
+        slot[1] += not ok
+        slot[2] += size
+    return histogram, timeline
+
+def run_load(hybrid, mix=DEFAULT_MIX, op='roundtrip', duration=DEFAULT_DURATION, concurrency=DEFAULT_CONCURRENCY,
+             rate=None, mode='threads'):
+    if op not in OPERATIONS:
+        raise ValueError(f"Unknown operation {op!r}, expected one of {OPERATIONS}")
+    keys = system_keys(hybrid)
+    pool = ThreadPoolExecutor if mode == 'threads' else ProcessPoolExecutor
+    with pool(concurrency) as executor:
+        start_at = time.time() + START_DELAY
+        futures = [executor.submit(run_worker, keys, mix, op, duration, rate / concurrency if rate else None,
+                                   start_at, worker) for worker in range(concurrency)]
+        results = [future.result() for future in futures]
+    histogram = LatencyHistogram()
+    timeline = {}
+    for worker_histogram, worker_timeline in results:
+        histogram.merge(worker_histogram)
+        for slot, (ops, failures, nbytes) in worker_timeline.items():
+            totals = timeline.setdefault(slot, [0, 0, 0])
+            totals[0] += ops
+            totals[1] += failures
+            totals[2] += nbytes
+    failures = sum(slot[1] for slot in timeline.values())
+    total_bytes = sum(slot[2] for slot in timeline.values())
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': {
+            'mix': [list(entry) for entry in mix],
+            'operation': op,
+            'duration_s': duration,
+            'concurrency': concurrency,
+            'target_rate': rate,
+            'mode': mode,
+            'lanes': hybrid.lanes,
+        },
+        'operations': histogram.total,
+        'failures': failures,
+        'throughput_ops_s': histogram.total / duration,
+        'throughput_mb_s': total_bytes / duration / 1e6,
+        'latency': histogram.summary(),
+        'timeline': [{'t_s': slot * TIMELINE_INTERVAL, 'ops': ops, 'failures': fails,
+                      'ops_per_s': ops / TIMELINE_INTERVAL} for slot, (ops, fails, _) in sorted(timeline.items())],
+        'histogram': [[value_ns, count] for value_ns, count in histogram.buckets()],
+    }
+
+def print_summary(report):
+    latency = report['latency']
+    print(f"{report['operations']:,} operations ({report['failures']} failed), "
+          f"{report['throughput_ops_s']:,.1f} ops/sec, {report['throughput_mb_s']:.2f} MB/s", file=sys.stderr)
+    print("Latency (ms): " + ", ".join(f"{key[:-3]} {latency[key]:.3f}" for key in latency if key.endswith('_ms')),
+          file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sustained load against the hybrid pipeline with latency histograms")
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help="message sizes with weights, e.g. 64:5,1024:3,16384:2")
+    parser.add_argument('--op', choices=OPERATIONS, default='roundtrip')
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION)
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--rate', type=float, default=None, help="target operations/sec across all workers (open loop)")
+    parser.add_argument('--mode', choices=('threads', 'processes'), default='threads')
+    parser.add_argument('--lanes', type=int, default=2)
+    parser.add_argument('--output', help="write the JSON report to this path instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = run_load(HybridCryptosystem(lanes=args.lanes), args.mix, args.op, args.duration, args.concurrency,
+                      args.rate, args.mode)
+    print_summary(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return 1 if report['failures'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+from cryptosystem import HybridCryptosystem, generate_chaos_params
+from profiling import observe
+
+DEFAULT_MIN_SIZE = 64 * 1024
+DEFAULT_MAX_SIZE = 2 * 1024 * 1024
+DEFAULT_FACTOR = 2
+DEFAULT_LANES = 2
+# Peak bytes allocated per input byte (numpy installed). Each lane holds its float64 orbit
+# and the argsort indices at once, 8 bytes per nucleotide each, i.e. 32 per input byte;
+# measured at about 38.5 (str) and 35 (bytes)
+DEFAULT_CEILINGS = {'str': 42.0, 'bytes': 38.0}
+APIS = ('str', 'bytes')
+
+class MemoryProfiler:
+    # Stage observer for profiling.timed: peak and retained tracemalloc bytes per stage,
+    # relative to the traced total when the stage started. Nested stages are supported;
+    # lanes must run serially since tracemalloc's peak is process wide.
+    def __init__(self):
+        self.stack = []
+        self.totals = {}
+
+    def start(self, stage):
+        current, peak = tracemalloc.get_traced_memory()
+        if self.stack:
+            self.stack[-1][2] = max(self.stack[-1][2], peak)
+        tracemalloc.reset_peak()
+        self.stack.append([stage, current, 0])
+
+    def finish(self):
+        current, peak = tracemalloc.get_traced_memory()
+        _, before, inner_peak = self.stack.pop()
+        peak = max(peak, inner_peak)
+        if self.stack:
+            self.stack[-1][2] = max(self.stack[-1][2], peak)
+        return peak - before, current - before
+
+    def record(self, stage, elapsed_ns, nbytes):
+        peak, retained = self.finish()
+        calls, max_peak, max_retained, total_bytes = self.totals.get(stage, (0, 0, 0, 0))
+        self.totals[stage] = (calls + 1, max(max_peak, peak), max(max_retained, retained), total_bytes + nbytes)
+
+    def measure(self, func):
+        # Returns (result, peak bytes above the starting level, bytes still held afterwards);
+        # the call is the outermost frame, so stage peaks propagate up into it
+        self.reset()
+        self.start(None)
+        with observe(self):
+            result = func()
+        return (result, *self.finish())
+
+    def reset(self):
+        self.stack.clear()
+        self.totals.clear()
+
+    def report(self):
+        rows = [{'stage': stage, 'calls': calls, 'peak_bytes': peak, 'retained_bytes': retained, 'bytes': nbytes}
+                for stage, (calls, peak, retained, nbytes) in self.totals.items()]
+        rows.sort(key=lambda row: row['peak_bytes'], reverse=True)
+        return rows
+
+def geometric_sizes(min_size=DEFAULT_MIN_SIZE, max_size=DEFAULT_MAX_SIZE, factor=DEFAULT_FACTOR):
+    sizes = []
+    size = min_size
+    while size <= max_size:
+        sizes.append(size)
+        size *= factor
+    return sizes
+
+def profile_size(size, api='str', lanes=DEFAULT_LANES):
+    hybrid = HybridCryptosystem(lanes=lanes)
+    chaos = generate_chaos_params(lanes)
+    data = os.urandom((size + 1) // 2).hex()[:size]
+    if api == 'bytes':
+        data = data.encode()
+        encrypt = lambda: hybrid.encrypt_bytes(data, chaos)
+        decrypt = lambda ct: hybrid.decrypt_bytes(ct[0], *chaos)
+    else:
+        encrypt = lambda: hybrid.encrypt(data, chaos)
+        decrypt = lambda ct: hybrid.decrypt(ct[0], *chaos)
+    profiler = MemoryProfiler()
+    ciphertext, enc_peak, enc_retained = profiler.measure(encrypt)
+    enc_stages = profiler.report()
+    plaintext, dec_peak, dec_retained = profiler.measure(lambda: decrypt(ciphertext))
+    if plaintext != data:
+        raise AssertionError(f"Round trip mismatch at {size} bytes ({api} API)")
+    return {
+        'size': size,
+        'encrypt': {'peak_bytes': enc_peak, 'retained_bytes': enc_retained, 'stages': enc_stages},
+        'decrypt': {'peak_bytes': dec_peak, 'retained_bytes': dec_retained, 'stages': profiler.report()},
+    }
+
+def fit_line(xs, ys):
+    # Least-squares slope and intercept
+    n = len(xs)
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x if var_x else 0.0
+    return slope, mean_y - slope * mean_x
+
+def run_profile(sizes, api='str', lanes=DEFAULT_LANES, ceiling=None):
+    if api not in APIS:
+        raise ValueError(f"Unknown API {api!r}, expected one of {APIS}")
+    ceiling = DEFAULT_CEILINGS[api] if ceiling is None else ceiling
+    tracemalloc.start()
+    try:
+        # Warm-up run so import-time and first-call allocations stay out of the series
+        profile_size(sizes[0], api, lanes)
+        runs = [profile_size(size, api, lanes) for size in sizes]
+    finally:
+        tracemalloc.stop()
+    fits = {}
+    for op in ('encrypt', 'decrypt'):
+        slope, intercept = fit_line(sizes, [run[op]['peak_bytes'] for run in runs])
+        fits[op] = {'bytes_per_input_byte': slope, 'intercept_bytes': intercept}
+    worst = max(fit['bytes_per_input_byte'] for fit in fits.values())
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'api': api,
+        'lanes': lanes,
+        'ceiling': ceiling,
+        'fits': fits,
+        'regression': worst > ceiling,
+        'runs': runs,
+    }
+
+def print_profile(report):
+    print(f"Memory scaling, {report['api']} API, {report['lanes']} lanes\n")
+    print("| Size       | Enc peak (MB) | Enc retained (MB) | Dec peak (MB) | Dec retained (MB) | Top encrypt stage  |")
+    print("|------------|---------------|-------------------|---------------|-------------------|--------------------|")
+    for run in report['runs']:
+        enc, dec = run['encrypt'], run['decrypt']
+        top = enc['stages'][0]['stage'] if enc['stages'] else '-'
+        print(f"| {run['size']:>10,} | {enc['peak_bytes'] / 1e6:>13.2f} | {enc['retained_bytes'] / 1e6:>17.2f} "
+              f"| {dec['peak_bytes'] / 1e6:>13.2f} | {dec['retained_bytes'] / 1e6:>17.2f} | {top:<18} |")
+    largest = report['runs'][-1]
+    for op in ('encrypt', 'decrypt'):
+        print(f"\nPer-stage memory, {op} of {largest['size']:,} bytes")
+        print("| Stage           | Peak (MB)  | Retained (MB) |")
+        print("|-----------------|------------|---------------|")
+        for row in largest[op]['stages']:
+            print(f"| {row['stage']:<15} | {row['peak_bytes'] / 1e6:>10.2f} | {row['retained_bytes'] / 1e6:>13.2f} |")
+    print()
+    for op, fit in report['fits'].items():
+        print(f"{op}: {fit['bytes_per_input_byte']:.2f} bytes per input byte "
+              f"(+{fit['intercept_bytes'] / 1e6:.2f} MB fixed)")
+    status = "REGRESSION" if report['regression'] else "ok"
+    print(f"Ceiling: {report['ceiling']:.2f} bytes per input byte -> {status}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Peak and retained memory of encrypt/decrypt across input sizes")
+    parser.add_argument('--min-size', type=int, default=DEFAULT_MIN_SIZE)
+    parser.add_argument('--max-size', type=int, default=DEFAULT_MAX_SIZE)
+    parser.add_argument('--factor', type=int, default=DEFAULT_FACTOR)
+    parser.add_argument('--api', choices=APIS, default='str')
+    parser.add_argument('--lanes', type=int, default=DEFAULT_LANES)
+    parser.add_argument('--ceiling', type=float, default=None, help="fail above this many bytes per input byte")
+    parser.add_argument('--output', help="write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    report = run_profile(geometric_sizes(args.min_size, args.max_size, args.factor), args.api, args.lanes, args.ceiling)
+    print_profile(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 1 if report['regression'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
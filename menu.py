@@ -1,11 +1,15 @@
-import os
-import sys
-import subprocess
+import runpy
 
 def run_script(script_name):
-    result = subprocess.run([sys.executable, script_name])
-    if result.returncode != 0:
-        print(f"\n[{script_name}] exited with code {result.returncode}.\n")
+    # Runs in this interpreter, so modules imported by one choice stay loaded for the next.
+    # For non-interactive use, see cli.py.
+    try:
+        runpy.run_path(script_name, run_name="__main__")
+    except SystemExit as e:
+        if e.code:
+            print(f"\n[{script_name}] exited with code {e.code}.\n")
+    except Exception as e:
+        print(f"\n[{script_name}] failed: {e}\n")
 
 def main_menu():
     scripts = [
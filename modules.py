@@ -1,67 +1,461 @@
 import random
 import os
+import sys
+import threading
+from array import array
+from collections import OrderedDict
 from Crypto.Cipher import AES
-from Crypto.Util.Padding import pad, unpad
+from Crypto.Util.Padding import pad
+from profiling import timed
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 class AES_CBC:
+    block_size = AES.block_size
+    # Bytes added in front of the ciphertext (the IV); padding is stripped by decrypt_into
+    overhead = AES.block_size
+
     def __init__(self, key=None):
         self.key = key if key else self.generate_key()
+        # ECB carries no state between calls, so one object per key is safe to reuse, also
+        # across threads. CBC objects chain through their IV and are built per message;
+        # GCM and CTR take a fresh nonce per message and have nothing reusable
+        self.ecb = AES.new(self.key, AES.MODE_ECB)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['ecb']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.ecb = AES.new(self.key, AES.MODE_ECB)
     
     def generate_key(self):
         return os.urandom(32)
     
-    def encrypt(self, plaintext):
-        cipher = AES.new(self.key, AES.MODE_CBC)
-        ct_bytes = cipher.encrypt(pad(plaintext, AES.block_size))
-        return cipher.iv + ct_bytes
+    def encrypt(self, plaintext, iv=None):
+        # iv is only fixed for reproducible analysis runs; normally a fresh random IV is used
+        cipher = AES.new(self.key, AES.MODE_CBC, iv=iv)
+        data = memoryview(plaintext).cast('B')
+        # Encrypt full blocks straight from the input; only the tail is copied for padding
+        full = len(data) - len(data) % AES.block_size
+        out = bytearray(AES.block_size + full + AES.block_size)
+        out[:AES.block_size] = cipher.iv
+        with memoryview(out) as view:
+            if full:
+                cipher.encrypt(data[:full], output=view[AES.block_size:AES.block_size + full])
+            cipher.encrypt(pad(bytes(data[full:]), AES.block_size), output=view[AES.block_size + full:])
+        return out
     
     def decrypt(self, ciphertext):
-        iv = ciphertext[:AES.block_size]
+        out = bytearray(max(len(ciphertext) - AES.block_size, 0))
+        with memoryview(out) as view:
+            length = self.decrypt_into(ciphertext, view)
+        if length is None:
+            return None
+        del out[length:]
+        return bytes(out)
+
+    def decrypt_into(self, ciphertext, output):
+        # Decrypts into a writable buffer of at least len(ciphertext) - block_size bytes, returns the plaintext length
+        ciphertext = memoryview(ciphertext).cast('B')
         ct = ciphertext[AES.block_size:]
-        cipher = AES.new(self.key, AES.MODE_CBC, iv)
+        if not ct or len(ct) % AES.block_size:
+            return None
+        target = output[:len(ct)]
+        if np is not None:
+            # CBC decryption is ECB decryption XOR the previous ciphertext block (the IV for the
+            # first): the per-key ECB object skips AES.new and decrypts every block in one pass
+            self.ecb.decrypt(ct, output=target)
+            values = np.frombuffer(target, dtype=np.uint8)
+            np.bitwise_xor(values, np.frombuffer(ciphertext[:len(ct)], dtype=np.uint8), out=values)
+        else:
+            AES.new(self.key, AES.MODE_CBC, bytes(ciphertext[:AES.block_size])).decrypt(ct, output=target)
+        pad_len = output[len(ct) - 1]
+        if not 1 <= pad_len <= AES.block_size or bytes(output[len(ct) - pad_len:len(ct)]) != bytes([pad_len]) * pad_len:
+            return None
+        return len(ct) - pad_len
+
+CTR_NONCE_SIZE = 8
+CTR_SEGMENT_SIZE = 4 * 1024 * 1024
+
+def ctr_segment(key, nonce, initial_block, data, output):
+    AES.new(key, AES.MODE_CTR, nonce=nonce, initial_value=initial_block).encrypt(data, output=output)
+
+class AES_CTR:
+    block_size = AES.block_size
+    overhead = CTR_NONCE_SIZE
+
+    def __init__(self, key=None, executor=None, segment_size=CTR_SEGMENT_SIZE):
+        if segment_size % AES.block_size:
+            raise ValueError(f"segment_size={segment_size} must be a multiple of {AES.block_size}")
+        self.key = key if key else self.generate_key()
+        # Segments write into one shared output buffer, so only thread pools can run them
+        self.executor = executor
+        self.segment_size = segment_size
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['executor'] = None
+        return state
+
+    def generate_key(self):
+        return os.urandom(32)
+
+    def apply_keystream(self, nonce, data, output):
+        # Each segment starts its own cipher at the matching counter block
+        n = len(data)
+        if self.executor is None or n <= self.segment_size:
+            ctr_segment(self.key, nonce, 0, data, output)
+            return
+        futures = []
+        for start in range(0, n, self.segment_size):
+            end = min(start + self.segment_size, n)
+            futures.append(self.executor.submit(ctr_segment, self.key, nonce, start // AES.block_size,
+                                                data[start:end], output[start:end]))
+        for future in futures:
+            future.result()
+
+    def encrypt(self, plaintext):
+        nonce = os.urandom(CTR_NONCE_SIZE)
+        data = memoryview(plaintext).cast('B')
+        out = bytearray(CTR_NONCE_SIZE + len(data))
+        out[:CTR_NONCE_SIZE] = nonce
+        with memoryview(out) as view:
+            self.apply_keystream(nonce, data, view[CTR_NONCE_SIZE:])
+        return out
+
+    def decrypt(self, ciphertext):
+        # CTR has no padding to check: a wrong key yields garbage rather than None
+        if len(ciphertext) < CTR_NONCE_SIZE:
+            return None
+        out = bytearray(len(ciphertext) - CTR_NONCE_SIZE)
+        with memoryview(out) as view:
+            self.decrypt_into(ciphertext, view)
+        return out
+
+    def decrypt_into(self, ciphertext, output):
+        if len(ciphertext) < CTR_NONCE_SIZE:
+            return None
+        ct = memoryview(ciphertext)[CTR_NONCE_SIZE:]
+        self.apply_keystream(bytes(ciphertext[:CTR_NONCE_SIZE]), ct, output[:len(ct)])
+        return len(ct)
+
+GCM_NONCE_SIZE = 12
+GCM_TAG_SIZE = 16
+
+class AES_GCM:
+    block_size = AES.block_size
+    overhead = GCM_NONCE_SIZE + GCM_TAG_SIZE
+
+    def __init__(self, key=None):
+        self.key = key if key else self.generate_key()
+
+    def generate_key(self):
+        return os.urandom(32)
+
+    def encrypt(self, plaintext):
+        nonce = os.urandom(GCM_NONCE_SIZE)
+        cipher = AES.new(self.key, AES.MODE_GCM, nonce=nonce)
+        data = memoryview(plaintext).cast('B')
+        n = len(data)
+        out = bytearray(GCM_NONCE_SIZE + n + GCM_TAG_SIZE)
+        out[:GCM_NONCE_SIZE] = nonce
+        with memoryview(out) as view:
+            if n:
+                cipher.encrypt(data, output=view[GCM_NONCE_SIZE:GCM_NONCE_SIZE + n])
+            view[GCM_NONCE_SIZE + n:] = cipher.digest()
+        return out
+
+    def decrypt(self, ciphertext):
+        if len(ciphertext) < self.overhead:
+            return None
+        out = bytearray(len(ciphertext) - self.overhead)
+        with memoryview(out) as view:
+            length = self.decrypt_into(ciphertext, view)
+        return out if length is not None else None
+
+    def decrypt_into(self, ciphertext, output):
+        # The tag is verified after decrypting; on failure the output is zeroed again so no
+        # unauthenticated plaintext is left behind
+        if len(ciphertext) < self.overhead:
+            return None
+        view = memoryview(ciphertext)
+        n = len(view) - self.overhead
+        cipher = AES.new(self.key, AES.MODE_GCM, nonce=bytes(view[:GCM_NONCE_SIZE]))
+        if n:
+            cipher.decrypt(view[GCM_NONCE_SIZE:GCM_NONCE_SIZE + n], output=output[:n])
         try:
-            pt = unpad(cipher.decrypt(ct), AES.block_size)
-            return pt
+            cipher.verify(bytes(view[GCM_NONCE_SIZE + n:]))
         except ValueError:
+            output[:n] = bytes(n)
             return None
+        return n
+
+CIPHER_BACKENDS = {'cbc': AES_CBC, 'ctr': AES_CTR, 'gcm': AES_GCM}
+
+def build_encode_table(mapping):
+    # One nucleotide quadruplet per byte value
+    table = []
+    for b in range(256):
+        bits = format(b, '08b')
+        table.append(''.join(mapping[bits[i:i+2]] for i in range(0, 8, 2)))
+    return table
+
+def build_digit_table(mapping):
+    # Nucleotides are base-4 digits in the same bit order
+    return str.maketrans({nuc: str(int(bits, 2)) for bits, nuc in mapping.items()})
+
+def build_symbol_filter(mapping):
+    # Deletes every nucleotide; whatever survives is not one
+    return str.maketrans('', '', ''.join(mapping.values()))
 
 class DNAEncoder:
     mapping = {'00':'A', '01':'T', '10':'C', '11':'G'}
     reverse_mapping = {v: k for k, v in mapping.items()}
-    
+    encode_table = build_encode_table(mapping)
+    digit_table = build_digit_table(mapping)
+    symbol_filter = build_symbol_filter(mapping)
+
     @staticmethod
     def encode(data_bytes):
-        binary = ''.join(format(b, '08b') for b in data_bytes)
-        return ''.join(DNAEncoder.mapping[binary[i:i+2]] for i in range(0, len(binary), 2))
-    
+        return ''.join(map(DNAEncoder.encode_table.__getitem__, memoryview(data_bytes).cast('B')))
+
     @staticmethod
     def decode(dna_str):
-        binary = ''.join(DNAEncoder.reverse_mapping[nuc] for nuc in dna_str)
-        return bytes(int(binary[i:i+8], 2) for i in range(0, len(binary), 8))
+        if not dna_str:
+            return b''
+        if len(dna_str) % 4:
+            raise ValueError(f"DNA length {len(dna_str)} is not a multiple of 4 nucleotides")
+        # int(..., 4) alone would also accept '_', whitespace and raw digits
+        invalid = dna_str.translate(DNAEncoder.symbol_filter)
+        if invalid:
+            raise ValueError(f"Invalid DNA symbol: {invalid[0]}")
+        digits = dna_str.translate(DNAEncoder.digit_table)
+        return int(digits, 4).to_bytes(len(dna_str) // 4, 'big')
+
+    @staticmethod
+    def to_symbols(data_bytes):
+        # Nucleotides as 2-bit values (A=0, T=1, C=2, G=3); a DNA string without NumPy
+        if np is None:
+            return DNAEncoder.encode(data_bytes)
+        packed = np.frombuffer(data_bytes, dtype=np.uint8)
+        symbols = np.empty(len(packed) * 4, dtype=np.uint8)
+        symbols[0::4] = packed >> 6
+        symbols[1::4] = (packed >> 4) & 3
+        symbols[2::4] = (packed >> 2) & 3
+        symbols[3::4] = packed & 3
+        return symbols
+
+    @staticmethod
+    def from_symbols(symbols):
+        if np is None:
+            return DNAEncoder.decode(symbols)
+        quads = symbols.reshape(-1, 4)
+        return ((quads[:, 0] << 6) | (quads[:, 1] << 4) | (quads[:, 2] << 2) | quads[:, 3]).tobytes()
+
+def invert_indices(indices):
+    if np is None:
+        inverse = [0] * len(indices)
+        for i, idx in enumerate(indices):
+            inverse[idx] = i
+        return inverse
+    inverse = np.empty(len(indices), dtype=np.intp)
+    inverse[indices] = np.arange(len(indices), dtype=np.intp)
+    return inverse
+
+def sort_indices(sequence):
+    if np is None:
+        indices = list(range(len(sequence)))
+        indices.sort(key=sequence.__getitem__)
+        return indices
+    # frombuffer sorts the orbit array in place of a float64 copy
+    return np.argsort(np.frombuffer(sequence, dtype=np.float64), kind='stable')
+
+def index_nbytes(indices):
+    if hasattr(indices, 'nbytes'):
+        return indices.nbytes
+    if isinstance(indices, array):
+        return sys.getsizeof(indices)
+    return sys.getsizeof(indices) + sum(sys.getsizeof(i) for i in indices[:1]) * len(indices)
+
+class PermutationCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key, forward, inverse):
+        size = index_nbytes(forward) + index_nbytes(inverse)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.current_bytes -= self.entries.pop(key)[2]
+            self.entries[key] = (forward, inverse, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.current_bytes -= evicted[2]
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+            }
 
 class ChaosMapper:
-    def __init__(self, r=None, x0=None, length=0):
+    def __init__(self, r=None, x0=None, length=0, cache=None):
         self.r = r if r else random.uniform(3.57, 4.0)
         self.x0 = x0 if x0 else random.uniform(0, 1)
         self.length = length
+        self.cache = cache
 
-    def get_indices(self):
+    def orbit(self):
+        # Sequential on purpose: every float must match the reference iteration.
+        # array('d') stores 8 bytes per value, a list of floats costs 32
         x = self.x0
-        sequence = []
-        for _ in range(self.length):
-            x = self.r * x * (1 - x)
-            sequence.append(x)
-        indices = list(range(self.length))
-        indices.sort(key=lambda i: sequence[i])
-        return indices
+        r = self.r
+        sequence = array('d', [0.0]) * self.length
+        for i in range(self.length):
+            x = r * x * (1 - x)
+            sequence[i] = x
+        return sequence
+
+    def compute_indices(self):
+        sequence = timed('orbit', self.orbit, nbytes=self.length)
+        return timed('sort', sort_indices, sequence, nbytes=self.length)
+
+    def cached_indices(self):
+        key = (self.r, self.x0, self.length)
+        pair = self.cache.get(key)
+        if pair is None:
+            forward = self.compute_indices()
+            inverse = invert_indices(forward)
+            # Cached arrays are shared between callers, so freeze them
+            if np is None:
+                forward, inverse = tuple(forward), tuple(inverse)
+            else:
+                forward.flags.writeable = False
+                inverse.flags.writeable = False
+            pair = (forward, inverse)
+            self.cache.put(key, forward, inverse)
+        return pair
+
+    def get_indices(self):
+        if self.cache is None:
+            return self.compute_indices()
+        return self.cached_indices()[0]
+
+    def get_inverse_indices(self):
+        if self.cache is None:
+            return invert_indices(self.compute_indices())
+        return self.cached_indices()[1]
+
+    def restore(self, seq):
+        if self.cache is None:
+            indices = self.compute_indices()
+            return timed('unpermute', ChaosMapper.unpermute, seq, indices, nbytes=len(seq))
+        inverse = self.get_inverse_indices()
+        return timed('unpermute', ChaosMapper.permute, seq, inverse, nbytes=len(seq))
 
     @staticmethod
     def permute(seq, indices):
-        return ''.join(seq[i] for i in indices)
-        
+        # seq is a DNA string, or a uint8 symbol array from DNAEncoder.to_symbols
+        if np is None:
+            return ''.join(seq[i] for i in indices)
+        if not isinstance(seq, str):
+            return seq[np.asarray(indices, dtype=np.intp)]
+        buf = np.frombuffer(seq.encode('ascii'), dtype=np.uint8)
+        return buf[np.asarray(indices, dtype=np.intp)].tobytes().decode('ascii')
+
     @staticmethod
     def unpermute(seq, indices):
-        res = [''] * len(seq)
-        for i, idx in enumerate(indices):
-            res[idx] = seq[i]
-        return ''.join(res)
+        if np is None:
+            res = [''] * len(seq)
+            for i, idx in enumerate(indices):
+                res[idx] = seq[i]
+            return ''.join(res)
+        buf = seq if not isinstance(seq, str) else np.frombuffer(seq.encode('ascii'), dtype=np.uint8)
+        res = np.empty_like(buf)
+        res[np.asarray(indices, dtype=np.intp)] = buf
+        return res if not isinstance(seq, str) else res.tobytes().decode('ascii')
+
+class LazyIndices:
+    # One lane's forward permutation, rebuilt from (r, x0, length) on first access and
+    # held as uint32 (array('I') without numpy) instead of a list of Python ints
+    __slots__ = ('r', 'x0', 'length', 'cache', 'values')
+
+    def __init__(self, r, x0, length, cache=None):
+        self.r = r
+        self.x0 = x0
+        self.length = length
+        self.cache = cache
+        self.values = None
+
+    def materialize(self):
+        if self.values is None:
+            indices = ChaosMapper(self.r, self.x0, self.length, cache=self.cache).get_indices()
+            if np is None:
+                self.values = array('I', indices)
+            elif self.cache is not None:
+                # Already frozen and owned by the cache, sharing it costs nothing
+                self.values = indices
+            else:
+                self.values = indices.astype(np.uint32)
+                self.values.flags.writeable = False
+        return self.values
+
+    def release(self):
+        self.values = None
+
+    @property
+    def nbytes(self):
+        if self.values is None:
+            return 0
+        return index_nbytes(self.values)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, item):
+        return self.materialize()[item]
+
+    def __iter__(self):
+        return iter(self.materialize())
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.materialize(), dtype=dtype)
+
+    def __repr__(self):
+        state = "materialized" if self.values is not None else "lazy"
+        return f"LazyIndices(r={self.r!r}, x0={self.x0!r}, length={self.length}, {state})"
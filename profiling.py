@@ -0,0 +1,74 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Active stage observer; None keeps every hook down to a single attribute check.
+# Observers live in this process only, lanes running on a process pool are not recorded.
+# An observer needs record(stage, elapsed_ns, nbytes), called once per stage even when the
+# stage raises; start(stage), called just before the stage runs, is optional.
+observer = None
+
+def set_observer(new_observer):
+    global observer
+    previous = observer
+    observer = new_observer
+    return previous
+
+@contextmanager
+def observe(new_observer):
+    previous = set_observer(new_observer)
+    try:
+        yield new_observer
+    finally:
+        set_observer(previous)
+
+def timed(stage, func, *args, nbytes=0):
+    if observer is None:
+        return func(*args)
+    active = observer
+    begin = getattr(active, 'start', None)
+    if begin is not None:
+        begin(stage)
+    start = time.perf_counter_ns()
+    try:
+        return func(*args)
+    finally:
+        active.record(stage, time.perf_counter_ns() - start, nbytes)
+
+class StageProfiler:
+    def __init__(self):
+        self.totals = {}
+        self.lock = threading.Lock()
+
+    def record(self, stage, elapsed_ns, nbytes):
+        with self.lock:
+            calls, total_ns, total_bytes = self.totals.get(stage, (0, 0, 0))
+            self.totals[stage] = (calls + 1, total_ns + elapsed_ns, total_bytes + nbytes)
+
+    def reset(self):
+        with self.lock:
+            self.totals.clear()
+
+    def report(self):
+        with self.lock:
+            grand_total = sum(total_ns for _, total_ns, _ in self.totals.values()) or 1
+            rows = []
+            for stage, (calls, total_ns, total_bytes) in self.totals.items():
+                rows.append({
+                    'stage': stage,
+                    'calls': calls,
+                    'total_ns': total_ns,
+                    'bytes': total_bytes,
+                    'share': total_ns / grand_total,
+                    'throughput_mb_s': total_bytes / (total_ns / 1e9) / 1e6 if total_ns else 0.0,
+                })
+        rows.sort(key=lambda row: row['total_ns'], reverse=True)
+        return rows
+
+def print_stage_report(rows, title="Per-stage breakdown"):
+    print(f"\n{title}")
+    print("| Stage           | Calls  | Total (ms) | Share  | MB/s      |")
+    print("|-----------------|--------|------------|--------|-----------|")
+    for row in rows:
+        print(f"| {row['stage']:<15} | {row['calls']:>6} | {row['total_ns'] / 1e6:>10.3f} "
+              f"| {row['share'] * 100:>5.1f}% | {row['throughput_mb_s']:>9.2f} |")
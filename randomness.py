@@ -0,0 +1,175 @@
+import sys
+import math
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ANALYSIS_CHUNK_SIZE = 1024 * 1024
+MONTE_CARLO_BYTES = 6
+# Monte Carlo points are two 24-bit coordinates; inside when within the quarter circle
+MONTE_CARLO_RADIUS_SQ = (256 ** 3 - 1) ** 2
+
+def iter_source(source, chunk_size=ANALYSIS_CHUNK_SIZE):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        # Zero-copy slices, so per-chunk temporaries stay bounded for in-memory data too
+        view = memoryview(source).cast('B')
+        for start in range(0, len(view), chunk_size):
+            yield view[start:start + chunk_size]
+    elif hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        yield from source
+
+def chi_square_p_value(chi_square, dof=255):
+    # Wilson-Hilferty normal approximation of the chi-square upper tail
+    if chi_square <= 0:
+        return 1.0
+    z = ((chi_square / dof) ** (1 / 3) - (1 - 2 / (9 * dof))) / math.sqrt(2 / (9 * dof))
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+class RandomnessStats:
+    def __init__(self):
+        self.counts = np.zeros(256, dtype=np.int64) if np is not None else [0] * 256
+        self.n = 0
+        self.first = None
+        self.last = None
+        self.sum_pairs = 0
+        self.mc_tail = b''
+        self.mc_points = 0
+        self.mc_inside = 0
+
+    def update(self, chunk):
+        # Oversized chunks are split: update_numpy holds a float64 copy of what it is given
+        view = memoryview(chunk).cast('B')
+        for start in range(0, len(view), ANALYSIS_CHUNK_SIZE):
+            piece = view[start:start + ANALYSIS_CHUNK_SIZE]
+            if np is not None:
+                self.update_numpy(np.frombuffer(piece, dtype=np.uint8))
+            else:
+                self.update_python(bytes(piece))
+
+    def update_numpy(self, data):
+        self.counts += np.bincount(data, minlength=256)
+        # float64 dot products go through BLAS and stay exact while a chunk's sum is below 2 ** 53
+        values = data.astype(np.float64)
+        # Serial correlation pairs, including the one spanning the previous chunk
+        self.sum_pairs += int(np.dot(values[:-1], values[1:]))
+        if self.last is not None:
+            self.sum_pairs += self.last * int(data[0])
+        self.finish_chunk(int(data[0]), int(data[-1]), len(data))
+        joined = np.frombuffer(self.mc_tail + data[:MONTE_CARLO_BYTES].tobytes(), dtype=np.uint8) if self.mc_tail else None
+        self.update_monte_carlo_numpy(data, joined)
+
+    def update_monte_carlo_numpy(self, data, joined):
+        start = 0
+        if joined is not None:
+            # Complete the point left over from the previous chunk first
+            if len(joined) < MONTE_CARLO_BYTES:
+                self.mc_tail = joined.tobytes()
+                return
+            self.count_points(joined[:MONTE_CARLO_BYTES].reshape(1, MONTE_CARLO_BYTES))
+            start = MONTE_CARLO_BYTES - len(self.mc_tail)
+        usable = (len(data) - start) // MONTE_CARLO_BYTES * MONTE_CARLO_BYTES
+        points = data[start:start + usable].reshape(-1, MONTE_CARLO_BYTES)
+        self.count_points(points)
+        self.mc_tail = data[start + usable:].tobytes()
+
+    def count_points(self, points):
+        if not len(points):
+            return
+        x = points[:, 0].astype(np.int64) << 16 | points[:, 1].astype(np.int64) << 8 | points[:, 2]
+        y = points[:, 3].astype(np.int64) << 16 | points[:, 4].astype(np.int64) << 8 | points[:, 5]
+        self.mc_points += len(points)
+        self.mc_inside += int(np.count_nonzero(x * x + y * y <= MONTE_CARLO_RADIUS_SQ))
+
+    def update_python(self, data):
+        for value, count in Counter(data).items():
+            self.counts[value] += count
+        self.sum_pairs += sum(a * b for a, b in zip(data, data[1:]))
+        if self.last is not None:
+            self.sum_pairs += self.last * data[0]
+        self.finish_chunk(data[0], data[-1], len(data))
+        buffer = self.mc_tail + data
+        usable = len(buffer) // MONTE_CARLO_BYTES * MONTE_CARLO_BYTES
+        for i in range(0, usable, MONTE_CARLO_BYTES):
+            x = int.from_bytes(buffer[i:i + 3], 'big')
+            y = int.from_bytes(buffer[i + 3:i + 6], 'big')
+            self.mc_points += 1
+            self.mc_inside += x * x + y * y <= MONTE_CARLO_RADIUS_SQ
+        self.mc_tail = buffer[usable:]
+
+    def finish_chunk(self, first, last, length):
+        if self.first is None:
+            self.first = first
+        self.last = last
+        self.n += length
+
+    def entropy(self):
+        if not self.n:
+            return 0.0
+        entropy = 0.0
+        for count in self.counts:
+            if count:
+                p = int(count) / self.n
+                entropy -= p * math.log2(p)
+        return entropy
+
+    def result(self):
+        n = self.n
+        if not n:
+            return {'bytes': 0, 'entropy': 0.0, 'chi_square': 0.0, 'chi_square_p': 1.0,
+                    'mean': 0.0, 'serial_correlation': float('nan'), 'monte_carlo_pi': float('nan'),
+                    'monte_carlo_error': float('nan')}
+        expected = n / 256
+        chi_square = sum((int(count) - expected) ** 2 for count in self.counts) / expected
+        total = sum(value * int(count) for value, count in enumerate(self.counts))
+        sum_sq = sum(value * value * int(count) for value, count in enumerate(self.counts))
+        # Serial correlation wraps around from the last byte to the first, as in ent
+        sum_pairs = self.sum_pairs + self.last * self.first
+        denominator = n * sum_sq - total * total
+        serial = (n * sum_pairs - total * total) / denominator if denominator else float('nan')
+        pi = 4 * self.mc_inside / self.mc_points if self.mc_points else float('nan')
+        return {
+            'bytes': n,
+            'entropy': self.entropy(),
+            'chi_square': chi_square,
+            'chi_square_p': chi_square_p_value(chi_square),
+            'mean': total / n,
+            'serial_correlation': serial,
+            'monte_carlo_pi': pi,
+            'monte_carlo_error': abs(pi - math.pi) / math.pi if self.mc_points else float('nan'),
+        }
+
+def analyze(source, chunk_size=ANALYSIS_CHUNK_SIZE):
+    stats = RandomnessStats()
+    for chunk in iter_source(source, chunk_size):
+        stats.update(chunk)
+    return stats.result()
+
+def analyze_file(path, chunk_size=ANALYSIS_CHUNK_SIZE):
+    with open(path, 'rb') as f:
+        return analyze(f, chunk_size)
+
+def shannon_entropy(data):
+    stats = RandomnessStats()
+    stats.update(data)
+    return stats.entropy()
+
+def print_report(report, label="Data"):
+    print(f"{label}: {report['bytes']:,} bytes")
+    print(f"  Entropy: {report['entropy']:.6f} bits/byte")
+    print(f"  Chi-square: {report['chi_square']:.2f} (p = {report['chi_square_p']:.4f})")
+    print(f"  Arithmetic mean: {report['mean']:.4f} (127.5 = random)")
+    print(f"  Serial correlation: {report['serial_correlation']:.6f} (0.0 = uncorrelated)")
+    print(f"  Monte Carlo pi: {report['monte_carlo_pi']:.9f} (error {report['monte_carlo_error'] * 100:.2f}%)")
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        print_report(analyze_file(path), path)
@@ -0,0 +1,182 @@
+import os
+import hmac
+import mmap
+import struct
+import hashlib
+from modules import CIPHER_BACKENDS
+from cryptosystem import (HybridCryptosystem, DEFAULT_LANES, CHAOS_R_MIN, CHAOS_R_MAX,
+                          iter_chunks, validate_chaos_params)
+
+SEEKABLE_MAGIC = b'4PSF'
+SEEKABLE_END_MAGIC = b'4PSE'
+SEEKABLE_VERSION = 2
+DEFAULT_SEGMENT_SIZE = 16 * 1024
+SALT_SIZE = 16
+CIPHER_IDS = list(CIPHER_BACKENDS)
+# magic, version, cipher id, lane count, plaintext segment size, file salt
+FILE_HEADER = struct.Struct(f'>4sBBHI{SALT_SIZE}s')
+# offset and length of one encrypted segment
+INDEX_ENTRY = struct.Struct('>QI')
+MAC_SIZE = hashlib.sha256().digest_size
+# index offset, plaintext size, segment count; the HMAC covers header, index and these fields
+TRAILER_FIELDS = struct.Struct('>QQI')
+# trailer fields, HMAC, end magic
+FILE_TRAILER = struct.Struct(f'>QQI{MAC_SIZE}s4s')
+
+def derive_bytes(file_key, salt, label, number):
+    return hmac.new(file_key, salt + label + struct.pack('>Q', number), hashlib.sha256).digest()
+
+def derive_lane_keys(file_key, salt, lanes):
+    return [derive_bytes(file_key, salt, b'aes-lane', lane) for lane in range(lanes)]
+
+def file_mac(file_key, salt, header, index, trailer_fields):
+    mac = hmac.new(derive_bytes(file_key, salt, b'file-mac', 0), header, hashlib.sha256)
+    mac.update(index)
+    mac.update(trailer_fields)
+    return mac.digest()
+
+def derive_segment_params(file_key, salt, segment, lanes):
+    # Every segment gets its own (r, x0) per lane, so any segment can be opened on its own
+    params = []
+    for lane in range(lanes):
+        digest = derive_bytes(file_key, salt, b'chaos-segment', segment * lanes + lane)
+        u_r, u_x0 = struct.unpack('>QQ', digest[:16])
+        params.append(CHAOS_R_MIN + (CHAOS_R_MAX - CHAOS_R_MIN) * u_r / 2 ** 64)
+        # Keep x0 strictly inside (0, 1): ChaosMapper treats 0 as "pick at random"
+        params.append((u_x0 + 1) / (2 ** 64 + 2))
+    validate_chaos_params(*params)
+    return tuple(params)
+
+def build_system(file_key, salt, lanes, cipher):
+    # Segments are sealed too, and the MAC binds each one to its own chaos parameters, i.e. its position
+    hybrid = HybridCryptosystem(lanes=lanes, cipher=CIPHER_BACKENDS[cipher],
+                                mac_key=derive_bytes(file_key, salt, b'segment-mac', 0))
+    hybrid.aes_lanes = [CIPHER_BACKENDS[cipher](key) for key in derive_lane_keys(file_key, salt, lanes)]
+    return hybrid
+
+def encrypt_file(source, target, file_key, segment_size=DEFAULT_SEGMENT_SIZE, lanes=DEFAULT_LANES, cipher='cbc'):
+    # target is a path or a writable binary file; nothing is seeked, so pipes work too
+    if isinstance(target, (str, os.PathLike)):
+        with open(target, 'wb') as f:
+            return write_seekable(source, f, file_key, segment_size, lanes, cipher)
+    return write_seekable(source, target, file_key, segment_size, lanes, cipher)
+
+def write_seekable(source, f, file_key, segment_size, lanes, cipher):
+    salt = os.urandom(SALT_SIZE)
+    hybrid = build_system(file_key, salt, lanes, cipher)
+    index = []
+    plaintext_size = 0
+    header = FILE_HEADER.pack(SEEKABLE_MAGIC, SEEKABLE_VERSION, CIPHER_IDS.index(cipher), lanes, segment_size, salt)
+    f.write(header)
+    offset = FILE_HEADER.size
+    for segment, chunk in enumerate(iter_chunks(source, segment_size)):
+        container = hybrid.encrypt_bytes(chunk, derive_segment_params(file_key, salt, segment, lanes))[0]
+        if container is None:
+            raise ValueError(f"Encrypting segment {segment} failed")
+        index.append((offset, len(container)))
+        f.write(container)
+        offset += len(container)
+        plaintext_size += len(chunk)
+    fields = (offset, plaintext_size, len(index))
+    index = b''.join(INDEX_ENTRY.pack(*entry) for entry in index)
+    mac = file_mac(file_key, salt, header, index, TRAILER_FIELDS.pack(*fields))
+    f.write(index)
+    f.write(FILE_TRAILER.pack(*fields, mac, SEEKABLE_END_MAGIC))
+    return fields[2]
+
+class SeekableReader:
+    def __init__(self, path, file_key):
+        # path may also be an in-memory buffer, e.g. a file read from a pipe
+        if isinstance(path, (bytes, bytearray, memoryview)):
+            self.file = None
+            self.map = path
+        else:
+            self.file = open(path, 'rb')
+            try:
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                self.file.close()
+                raise ValueError(f"{path} is empty, not a seekable 4P file")
+        try:
+            self.parse(file_key)
+        except Exception:
+            self.close()
+            raise
+
+    def parse(self, file_key):
+        if len(self.map) < FILE_HEADER.size + FILE_TRAILER.size:
+            raise ValueError("File too short for a seekable 4P file")
+        magic, version, cipher_id, lanes, segment_size, salt = FILE_HEADER.unpack_from(self.map)
+        trailer_offset = len(self.map) - FILE_TRAILER.size
+        index_offset, size, count, mac, end_magic = FILE_TRAILER.unpack_from(self.map, trailer_offset)
+        if magic != SEEKABLE_MAGIC or end_magic != SEEKABLE_END_MAGIC:
+            raise ValueError("Not a seekable 4P file")
+        if version != SEEKABLE_VERSION:
+            raise ValueError(f"Unsupported seekable file version {version}")
+        if cipher_id >= len(CIPHER_IDS):
+            raise ValueError(f"Unknown cipher id {cipher_id}")
+        if index_offset + count * INDEX_ENTRY.size != trailer_offset:
+            raise ValueError("Segment index does not fit the file")
+        # Slices copy out of the map: the index is about 12 bytes per segment
+        expected = file_mac(file_key, salt, bytes(self.map[:FILE_HEADER.size]),
+                            bytes(self.map[index_offset:trailer_offset]),
+                            bytes(self.map[trailer_offset:trailer_offset + TRAILER_FIELDS.size]))
+        if not hmac.compare_digest(mac, expected):
+            raise ValueError("File MAC mismatch: wrong key or tampered header, index or trailer")
+        if not lanes or not segment_size or count != -(-size // segment_size):
+            raise ValueError(f"{count} segments of {segment_size} bytes cannot hold {size} bytes")
+        self.file_key = file_key
+        self.salt = salt
+        self.lanes = lanes
+        self.segment_size = segment_size
+        self.size = size
+        self.count = count
+        self.index_offset = index_offset
+        self.hybrid = build_system(file_key, salt, lanes, CIPHER_IDS[cipher_id])
+
+    def __len__(self):
+        return self.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.file is not None:
+            self.map.close()
+            self.file.close()
+
+    def read_segment(self, segment):
+        if not 0 <= segment < self.count:
+            raise IndexError(f"Segment {segment} out of range for {self.count} segments")
+        # Index entries are unpacked on demand, so opening a large file costs no per-segment work
+        offset, length = INDEX_ENTRY.unpack_from(self.map, self.index_offset + segment * INDEX_ENTRY.size)
+        params = derive_segment_params(self.file_key, self.salt, segment, self.lanes)
+        # Slicing the map copies just this segment and leaves no exported buffer behind
+        plain = self.hybrid.open_container(bytes(self.map[offset:offset + length]), params)
+        expected = min(self.segment_size, self.size - segment * self.segment_size)
+        if len(plain) != expected:
+            raise ValueError(f"Segment {segment} holds {len(plain)} bytes, expected {expected}")
+        return plain
+
+    def segments(self):
+        for segment in range(self.count):
+            yield self.read_segment(segment)
+
+    def read(self, offset, size):
+        # Only the segments covering [offset, offset + size) are decrypted
+        if offset < 0 or size < 0:
+            raise ValueError("offset and size must be non-negative")
+        end = min(offset + size, self.size)
+        if offset >= end:
+            return b''
+        out = bytearray()
+        first = offset // self.segment_size
+        last = (end - 1) // self.segment_size
+        for segment in range(first, last + 1):
+            plain = self.read_segment(segment)
+            base = segment * self.segment_size
+            out += plain[max(offset - base, 0):end - base]
+        return bytes(out)
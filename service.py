@@ -0,0 +1,347 @@
+import os
+import sys
+import time
+import struct
+import asyncio
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from cryptosystem import HybridCryptosystem
+from batch import encrypt_bytes_chunk, open_envelope_chunk, system_keys
+from benchmark import percentile
+
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8757
+MAX_BATCH = 64
+BATCH_DELAY = 0.002
+QUEUE_SIZE = 1024
+# Largest request frame the service will read; the length prefix comes from the client
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+OP_ENCRYPT = 1
+OP_DECRYPT = 2
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+# Every message is a 4-byte length followed by that many bytes
+FRAME_LENGTH = struct.Struct('>I')
+# op or status, request id
+MESSAGE_HEADER = struct.Struct('>BI')
+PARAM_COUNT = struct.Struct('>H')
+
+def pack_params(params):
+    params = params or ()
+    return PARAM_COUNT.pack(len(params)) + struct.pack(f'>{len(params)}d', *params)
+
+def unpack_params(body, offset=0):
+    (count,) = PARAM_COUNT.unpack_from(body, offset)
+    offset += PARAM_COUNT.size
+    params = struct.unpack_from(f'>{count}d', body, offset)
+    return params, offset + 8 * count
+
+class FrameError(ValueError):
+    pass
+
+async def read_frame(reader, max_size=None):
+    try:
+        header = await reader.readexactly(FRAME_LENGTH.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (length,) = FRAME_LENGTH.unpack(header)
+    if max_size is not None and length > max_size:
+        raise FrameError(f"Frame of {length} bytes exceeds the {max_size}-byte limit")
+    return await reader.readexactly(length)
+
+def write_frame(writer, header, body):
+    writer.write(FRAME_LENGTH.pack(len(header) + len(body)) + header)
+    writer.write(body)
+
+class EncryptionService:
+    def __init__(self, hybrid, executor=None, max_workers=None, max_batch=MAX_BATCH,
+                 batch_delay=BATCH_DELAY, queue_size=QUEUE_SIZE, max_frame_size=MAX_FRAME_SIZE):
+        self.hybrid = hybrid
+        self.keys = system_keys(hybrid)
+        self.own_executor = executor is None
+        self.executor = executor or ProcessPoolExecutor(max_workers)
+        self.max_batch = max_batch
+        self.batch_delay = batch_delay
+        self.max_frame_size = max_frame_size
+        # Bounded queues: a full queue stops connections from reading further requests
+        self.queues = {OP_ENCRYPT: asyncio.Queue(queue_size), OP_DECRYPT: asyncio.Queue(queue_size)}
+        self.inflight = asyncio.Semaphore(2 * (max_workers or os.cpu_count() or 1))
+        self.tasks = []
+        # The event loop only keeps weak references to tasks, so running batches are held here
+        self.batches = set()
+        self.connections = {}
+        self.server = None
+
+    async def start(self, host=SERVICE_HOST, port=SERVICE_PORT, path=None):
+        self.tasks = [asyncio.create_task(self.dispatch(op)) for op in self.queues]
+        if path:
+            self.server = await asyncio.start_unix_server(self.handle_connection, path)
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+        # Closing the transports hands every connection handler an EOF
+        for writer in list(self.connections.values()):
+            writer.close()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        if self.server:
+            await self.server.wait_closed()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await asyncio.gather(*self.batches, return_exceptions=True)
+        if self.own_executor:
+            self.executor.shutdown()
+
+    def parse_request(self, op, body):
+        if op == OP_ENCRYPT:
+            params, offset = unpack_params(body)
+            return bytes(body[offset:]), params or None
+        if op == OP_DECRYPT:
+            params, offset = unpack_params(body)
+            return bytes(body[offset:]), params
+        raise ValueError(f"Unknown op {op}")
+
+    async def handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self.connections[task] = writer
+        try:
+            while True:
+                try:
+                    frame = await read_frame(reader, self.max_frame_size)
+                except FrameError as e:
+                    # The unread body leaves the stream out of step, so this connection ends here
+                    self.reject(writer, 0, str(e))
+                    await writer.drain()
+                    break
+                if frame is None:
+                    break
+                if len(frame) < MESSAGE_HEADER.size:
+                    # No request id to answer to; 0 tells the client the frame itself was bad
+                    self.reject(writer, 0, f"Frame of {len(frame)} bytes is shorter than the message header")
+                    continue
+                op, request_id = MESSAGE_HEADER.unpack_from(frame)
+                future = asyncio.get_running_loop().create_future()
+                future.add_done_callback(lambda f, rid=request_id, o=op: self.respond(writer, o, rid, f))
+                try:
+                    item = self.parse_request(op, memoryview(frame)[MESSAGE_HEADER.size:])
+                except (ValueError, struct.error) as e:
+                    future.set_exception(e)
+                    continue
+                await self.queues[op].put((item, future))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections.pop(task, None)
+            writer.close()
+
+    def reject(self, writer, request_id, message):
+        write_frame(writer, MESSAGE_HEADER.pack(STATUS_ERROR, request_id), message.encode())
+
+    def respond(self, writer, op, request_id, future):
+        if writer.is_closing() or future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            self.reject(writer, request_id, str(error))
+            return
+        result = future.result()
+        if op == OP_DECRYPT:
+            # A DecryptResult: a refused container carries its error code instead of being printed
+            if result.ok:
+                write_frame(writer, MESSAGE_HEADER.pack(STATUS_OK, request_id), bytes(result.plaintext))
+            else:
+                self.reject(writer, request_id, f"{result.code}: {result.error}")
+        elif result[0] is None:
+            self.reject(writer, request_id, "Encryption failed")
+        else:
+            write_frame(writer, MESSAGE_HEADER.pack(STATUS_OK, request_id), pack_params(result[1:]) + result[0])
+
+    async def dispatch(self, op):
+        # Micro-batching: take whatever arrives within batch_delay, up to max_batch requests
+        queue = self.queues[op]
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.batch_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.inflight.acquire()
+            task = asyncio.create_task(self.run_batch(op, batch))
+            self.batches.add(task)
+            task.add_done_callback(self.batches.discard)
+
+    async def run_batch(self, op, batch):
+        func = encrypt_bytes_chunk if op == OP_ENCRYPT else open_envelope_chunk
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, func, self.keys, [item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.inflight.release()
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+class ServiceError(Exception):
+    pass
+
+class AsyncClient:
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self.pending = {}
+        self.next_id = 0
+        self.listener = None
+
+    @classmethod
+    async def connect(cls, host=SERVICE_HOST, port=SERVICE_PORT, path=None):
+        client = cls()
+        if path:
+            client.reader, client.writer = await asyncio.open_unix_connection(path)
+        else:
+            client.reader, client.writer = await asyncio.open_connection(host, port)
+        client.listener = asyncio.create_task(client.listen())
+        return client
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.listener.cancel()
+        await asyncio.gather(self.listener, return_exceptions=True)
+
+    async def listen(self):
+        # Responses can arrive in any order; request ids route them back to their callers
+        try:
+            while True:
+                frame = await read_frame(self.reader)
+                if frame is None:
+                    break
+                status, request_id = MESSAGE_HEADER.unpack_from(frame)
+                future = self.pending.pop(request_id, None)
+                if future is not None and not future.done():
+                    future.set_result((status, frame[MESSAGE_HEADER.size:]))
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Service connection closed"))
+            self.pending.clear()
+
+    async def request(self, op, body):
+        request_id = self.next_id
+        self.next_id = (self.next_id + 1) % 2 ** 32
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        write_frame(self.writer, MESSAGE_HEADER.pack(op, request_id), body)
+        await self.writer.drain()
+        status, payload = await future
+        if status != STATUS_OK:
+            raise ServiceError(payload.decode(errors="replace"))
+        return payload
+
+    async def encrypt(self, data, chaos_params=None):
+        payload = await self.request(OP_ENCRYPT, pack_params(chaos_params) + bytes(data))
+        params, offset = unpack_params(payload)
+        return payload[offset:], params
+
+    async def decrypt(self, container, chaos_params):
+        return await self.request(OP_DECRYPT, pack_params(chaos_params) + bytes(container))
+
+async def load_test(client_count=16, duration=5.0, message_size=256, host=SERVICE_HOST, port=SERVICE_PORT, path=None):
+    latencies = []
+    failures = 0
+    message = os.urandom(message_size)
+
+    async def worker():
+        nonlocal failures
+        client = await AsyncClient.connect(host, port, path)
+        try:
+            while time.perf_counter() < stop:
+                start = time.perf_counter_ns()
+                try:
+                    container, params = await client.encrypt(message)
+                    if await client.decrypt(container, params) != message:
+                        failures += 1
+                except ServiceError:
+                    failures += 1
+                latencies.append(time.perf_counter_ns() - start)
+        finally:
+            await client.close()
+
+    start = time.perf_counter()
+    stop = start + duration
+    await asyncio.gather(*(worker() for _ in range(client_count)))
+    elapsed = time.perf_counter() - start
+    ordered = sorted(latencies)
+    return {
+        'clients': client_count,
+        'message_size': message_size,
+        'requests': len(ordered),
+        'failures': failures,
+        'requests_per_second': len(ordered) / elapsed,
+        'p50_ms': percentile(ordered, 0.5) / 1e6 if ordered else 0.0,
+        'p99_ms': percentile(ordered, 0.99) / 1e6 if ordered else 0.0,
+    }
+
+async def serve(args):
+    service = EncryptionService(HybridCryptosystem(lanes=args.lanes), max_workers=args.workers)
+    await service.start(args.host, args.port, args.path)
+    print(f"Serving hybrid encryption on {args.path or f'{args.host}:{args.port}'}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await service.close()
+
+async def run_load_test(args):
+    # Round trips (encrypt + decrypt) against an in-process service on a private port
+    service = EncryptionService(HybridCryptosystem(lanes=args.lanes), max_workers=args.workers)
+    server = await service.start(args.host, 0, args.path)
+    port = None if args.path else server.sockets[0].getsockname()[1]
+    try:
+        report = await load_test(args.clients, args.duration, args.size, args.host, port, args.path)
+    finally:
+        await service.close()
+    print(f"Clients: {report['clients']}, message size: {report['message_size']} bytes")
+    print(f"Round trips: {report['requests']} ({report['failures']} failed)")
+    print(f"Throughput: {report['requests_per_second']:,.1f} round trips/sec")
+    print(f"Latency p50: {report['p50_ms']:.3f} ms, p99: {report['p99_ms']:.3f} ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local hybrid encryption service")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name in ('serve', 'loadtest'):
+        cmd = sub.add_parser(name)
+        cmd.add_argument('--host', default=SERVICE_HOST)
+        cmd.add_argument('--port', type=int, default=SERVICE_PORT)
+        cmd.add_argument('--path', help="listen on this Unix socket instead of TCP")
+        cmd.add_argument('--lanes', type=int, default=2)
+        cmd.add_argument('--workers', type=int, default=None)
+        if name == 'loadtest':
+            cmd.add_argument('--clients', type=int, default=16)
+            cmd.add_argument('--duration', type=float, default=5.0)
+            cmd.add_argument('--size', type=int, default=256)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args) if args.command == 'serve' else run_load_test(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
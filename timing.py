@@ -1,5 +1,7 @@
-import time
 from cryptosystem import HybridCryptosystem
+from benchmark import measure, summarize
+
+TIMING_WARMUP = 1
 
 def main():
     print("Cryptosystem Time Calculation: Hybrid AES + DNA Encoding + Chaos Mapping\n")
@@ -9,26 +11,28 @@ def main():
         iterations = int(iterations)
     except ValueError:
         iterations = 10
+    report = time_round_trips(sample_text, iterations)
+    print_timing(report, iterations)
+
+def time_round_trips(sample_text, iterations=10):
     hybrid = HybridCryptosystem()
     # Time encryption
-    start_enc = time.time()
-    for _ in range(iterations):
-        encrypted, _, _, r_left, x0_left, r_right, x0_right = hybrid.encrypt(sample_text)
-    end_enc = time.time()
-    avg_enc = (end_enc - start_enc) / iterations
-    # Time decryption
-    decrypt_success = 0
-    start_dec = time.time()
-    for _ in range(iterations):
-        result = hybrid.decrypt(encrypted, r_left, x0_left, r_right, x0_right)
-        if result is not None:
-            decrypt_success += 1
-    end_dec = time.time()
-    avg_dec = (end_dec - start_dec) / decrypt_success if decrypt_success > 0 else float('inf')
-    print(f"Average encryption time over {iterations} runs: {avg_enc:.6f} seconds")
-    print(f"Average decryption time over {decrypt_success} successful runs: {avg_dec:.6f} seconds")
-    if decrypt_success < iterations:
-        print(f"Warning: {iterations - decrypt_success} decryptions failed.")
+    enc = summarize(measure(lambda: hybrid.encrypt(sample_text), TIMING_WARMUP, iterations))
+    encrypted, _, _, r_left, x0_left, r_right, x0_right = hybrid.encrypt(sample_text)
+    # Time decryption, every run counts towards the average whether it succeeds or not
+    results = []
+    dec = summarize(measure(lambda: results.append(hybrid.decrypt(encrypted, r_left, x0_left, r_right, x0_right)),
+                            TIMING_WARMUP, iterations))
+    return {'encrypt': enc, 'decrypt': dec, 'decrypt_failures': results[TIMING_WARMUP:].count(None)}
+
+def print_timing(report, iterations):
+    enc, dec = report['encrypt'], report['decrypt']
+    print(f"Average encryption time over {iterations} runs: {enc['mean_ns'] / 1e9:.6f} seconds "
+          f"(median {enc['median_ns'] / 1e9:.6f}, p95 {enc['p95_ns'] / 1e9:.6f})")
+    print(f"Average decryption time over {iterations} runs: {dec['mean_ns'] / 1e9:.6f} seconds "
+          f"(median {dec['median_ns'] / 1e9:.6f}, p95 {dec['p95_ns'] / 1e9:.6f})")
+    if report['decrypt_failures']:
+        print(f"Warning: {report['decrypt_failures']} decryptions failed.")
 
 if __name__ == "__main__":
     main()